@@ -1,9 +1,76 @@
-import serial
-import pyaudio
-import librosa as rosa
+import queue
 import wave
 import numpy as np
-import matplotlib.pyplot as plt
+import multiprocessing as mp
+from wav_mmap import MappedWave
+from track_analysis import analysis_rate, analysis_waveform, onset_envelope, segmented_onset_envelope
+from ring_buffer import RingBuffer, SharedRingBuffer
+from sensor_protocol import make_decoder
+from blit_renderer import BlitRenderer
+from instrument import StageTimer
+from pop_detector import PopDetector
+from beat_grid import BeatGrid
+
+def _audio_worker(audio_filename, chunk, position_queue, stop_event):
+    """Pipeline worker: play the audio file chunk by chunk and report each chunk played.
+
+    Args:
+        audio_filename (str): From which file to play the audio
+        chunk (int): The chunk length (in # of samples)
+        position_queue (mp.Queue): Gets the number of chunks played after each one, and None at the end
+        stop_event (mp.Event): Set when the playback should stop early
+    """
+
+    try:
+        import pyaudio
+
+        mapped_wave = MappedWave(audio_filename)
+        p = pyaudio.PyAudio()
+        stream = p.open(
+            format=p.get_format_from_width(mapped_wave.getsampwidth()),
+            channels=mapped_wave.getnchannels(),
+            rate=mapped_wave.getframerate(),
+            output=True,
+            frames_per_buffer=chunk)
+
+        bytes_per_chunk = chunk * mapped_wave.getnchannels() * mapped_wave.getsampwidth()
+        raw = mapped_wave.raw
+        for i, start in enumerate(range(0, len(raw), bytes_per_chunk)):
+            if stop_event.is_set():
+                break
+            stream.write(raw[start:start + bytes_per_chunk].tobytes())
+            position_queue.put(i + 1)
+
+        stream.close()
+        p.terminate()
+    finally:
+        # the main process stops at the end of the playback, also when it failed
+        position_queue.put(None)
+
+def _sensor_worker(serial_settings, protocol, sensor_buffer, stop_event):
+    """Pipeline worker: drain the serial port into a shared ring buffer.
+
+    Args:
+        serial_settings (dict): port and serial.Serial.get_settings() of the serial input
+        protocol (str): Either 'ascii' or 'binary', see sensor_protocol
+        sensor_buffer (SharedRingBuffer): Where the force readings go
+        stop_event (mp.Event): Set when the acquisition should stop, and by the worker when it fails
+    """
+
+    try:
+        import serial
+
+        ser = serial.Serial(**serial_settings)
+        decoder = make_decoder(protocol)
+        while not stop_event.is_set():
+            forces = decoder.decode(ser.read(max(1, ser.in_waiting)))
+            if len(forces) > 0:
+                sensor_buffer.extend(forces)
+        ser.close()
+    finally:
+        # a session without the sensor readings is pointless, stop the playback as well
+        stop_event.set()
+        sensor_buffer.close()
 
 class Pop_on_Beat:
     """A class that detects beat in audio file and 'pop' signal from sensor
@@ -12,7 +79,8 @@ class Pop_on_Beat:
     Copyright 2018 Yanwen Xiong
     """
 
-    def __init__(self, serial_port, baud_rate, audio_filename, chunk=2048, hop_length=512):
+    def __init__(self, serial_port, baud_rate, audio_filename, chunk=2048, hop_length=512, protocol='ascii', pa=None,
+                 replay=None):
         """Initialize serial input handle, plot handle, wave object and audio stream.
 
         Args:
@@ -21,92 +89,192 @@ class Pop_on_Beat:
             audio_filename (str): From which file to read the audio
             chunk (int): The chunk (frame) length (in # of samples)
             hop_length (int): By how many samples the frame is shifted
+            protocol (str): Either 'ascii' (one reading per text line) or 'binary' (compact frames, see sensor_protocol)
+            pa (pyaudio.PyAudio): Audio interface to play through, a new pyaudio.PyAudio() by default
+            replay (replay.ReplaySource): If given, a captured sensor trace is replayed in place of the serial
+                input and the audio goes to its clock instead of a sound card; serial_port, baud_rate and pa are
+                ignored. A replay as fast as possible isn't rendered, and can't run_pipeline().
         """
 
         self.__chunk = chunk
         self.__hop_length = hop_length
         self.__frames_per_chunk = int(self.__chunk/self.__hop_length)
+        self.__audio_filename = audio_filename
+        self.__channel = 'right'
+        self.__analysis_sr = None
+        self.__protocol = protocol
+        self.__timers = StageTimer()
+        self.__replay = replay
+        self.__rendered = replay is None or replay.realtime
 
         # initialize serial input handle
-        self.__ser = serial.Serial(
-            port=serial_port,
-            baudrate=baud_rate,
-            parity=serial.PARITY_ODD,
-            stopbits=serial.STOPBITS_TWO,
-            bytesize=serial.SEVENBITS)
-
-        # initialize plot handle
-        self.__fig, (self.__ax_sensor, self.__ax_onset) = plt.subplots(nrows=2, ncols=1, sharex=False)
+        if replay is None:
+            import serial
+            self.__ser = serial.Serial(
+                port=serial_port,
+                baudrate=baud_rate,
+                parity=serial.PARITY_ODD,
+                stopbits=serial.STOPBITS_TWO,
+                bytesize=serial.EIGHTBITS if protocol == 'binary' else serial.SEVENBITS)
+        else:
+            self.__ser = replay.serial
+            pa = replay.pa
+        self.__decoder = make_decoder(protocol)
+        self.__pop_detector = PopDetector()
+        self.__beat_grid = None
+        self.__track_beats = None
+
+        # initialize plot handle, nothing is drawn (and matplotlib isn't even imported) for a fast replay
+        if self.__rendered:
+            import matplotlib.pyplot as plt
+            self.__fig, (self.__ax_sensor, self.__ax_onset) = plt.subplots(nrows=2, ncols=1, sharex=False)
 
         # initialize wave object
         self.__wf = wave.open(audio_filename, 'rb')
+        self.__fs = self.__wf.getframerate()                # sampling rate
 
         # initialize audio stream
-        self.__p = pyaudio.PyAudio()
+        if pa is None:
+            import pyaudio
+            pa = pyaudio.PyAudio()
+        self.__p = pa
         self.__stream = self.__p.open(
             format=self.__p.get_format_from_width(self.__wf.getsampwidth()),
             channels=self.__wf.getnchannels(),
             rate=self.__wf.getframerate(),
             output=True)
 
-    def init_plot(self, sensor_data_point=50, frames_in_sec=86):
+    @property
+    def beat_grid(self):
+        """The beat grid (BeatGrid) of the track, None until get_beat_grid() is called."""
+        return self.__beat_grid
+
+    @property
+    def timers(self):
+        """The per-stage latency histograms (StageTimer) of the update_*() steps and the pipeline loop."""
+        return self.__timers
+
+    @property
+    def pop_detector(self):
+        """The streaming detector (PopDetector) of the pops."""
+        return self.__pop_detector
+
+    def get_pops(self):
+        """Class method for getting the pops detected since reinit_onset_plot().
+
+        Returns:
+            np.ndarray: The start times of the pops (s, position in the audio when their readings were read)
+        """
+
+        return np.concatenate(self.__pop_log)
+
+    @property
+    def sensor_count(self):
+        """How many force readings have been read since reinit_onset_plot()."""
+        return self.__sensor_count
+
+    def init_plot(self, sensor_data_point=50, frames_in_sec=86, fps=60, show_fps=False):
         """Class method for initializing the plots.
 
         Args:
             sensor_data_point (int): How many data points are shown on the sensor data plot
             frames_in_sec (int): How many frames (data points) are shown on the beat plot
+            fps (float): Target frame rate of the plot, update_plot() skips the frames in between
+            show_fps (bool): Whether to show the measured frame rate on the plot
         """
 
+        self.__ysensor = RingBuffer(sensor_data_point)
+        self.__yonset = RingBuffer(frames_in_sec)
+        if not self.__rendered:
+            return
+
         # initialize sensor data plot
         self.__ax_sensor.set_ylim(0, 1023)
-        self.__ysensor = sensor_data_point * [0.0]
-        self.__line_sensor, = self.__ax_sensor.plot(self.__ysensor, 'r-')
+        self.__line_sensor, = self.__ax_sensor.plot(self.__ysensor.view(), 'r-')
 
         # initialize beat plot
         self.__ax_onset.set_ylim(-.1, 1.)
-        self.__yonset = frames_in_sec * [0.0]
-        self.__line_onset, = self.__ax_onset.plot(self.__yonset, 'r-')
+        self.__line_onset, = self.__ax_onset.plot(self.__yonset.view(), 'r-')
+
+        # only the two lines are redrawn on every frame
+        self.__renderer = BlitRenderer(self.__fig, [self.__line_sensor, self.__line_onset], fps, show_fps)
 
-    def get_audio_waveform(self, channel='right'):
+    def get_audio_waveform(self, channel='right', analysis_sr=None):
         """Class method for getting the audio (mono) waveform.
 
+        The data chunk of the file is memory-mapped, so a single channel at the file's rate
+        is a strided view into the file rather than a copy of it. A mix or a lower analysis
+        rate goes through the front end of track_analysis.analysis_waveform() (float32).
+
         Args:
-            channel (str): Either 'left' or 'right', from which channel to get the audio waveform
+            channel (str): Either 'left', 'right' or 'mix' (all channels), from which channel to get the audio waveform
+            analysis_sr (int): Rate at which the onsets are analyzed, e.g. 22050 for about half the work;
+                None for the file's rate. The onset envelope keeps a frame per hop_length samples of the file.
         """
 
-        self.__fs = self.__wf.getframerate()                # sampling rate
+        self.__mapped_wave = MappedWave(self.__audio_filename)
+        # 2D (frames x channels) view of the audio
+        self.__audio = self.__mapped_wave.frames
+        self.__channel = channel
+        self.__analysis_sr = analysis_sr
+        # select (or mix down) the channels and resample for analysis
+        self.__audio_waveform = analysis_waveform(self.__mapped_wave, channel, analysis_sr, self.__hop_length).waveform
 
-        bytes_per_sample = self.__wf.getsampwidth()
-        bits_per_sample = 8 * bytes_per_sample
-        dtype = 'int{0}'.format(bits_per_sample)
-
-        channels = self.__wf.getnchannels()                 # number of channels
-        samples = self.__wf.getnframes()                    # total samples in the track
-        duration = samples / float(self.__fs)               # duration of the track
-
-        self.__audio = np.fromstring(
-            self.__wf.readframes(int(duration*self.__fs*bytes_per_sample/channels)),
-            dtype=dtype)
-        # reshape the audio array into 2D
-        self.__audio.shape = (self.__audio.shape[0] // channels, channels)
-        if channel == 'left':
-            ch = 0
-        else:
-            ch = 1
-        self.__audio_waveform = self.__audio[:, ch]
+    def get_onset_envelope(self, cache=None, segment_frames=None, workers=None):
+        """Class method for getting the onset envelope of the audio file.
 
-    def get_onset_envelope(self):
-        """Class method for getting the onset envelope of the audio file."""
+        Args:
+            cache (OnsetCache): If given, the envelope is looked up in (and stored to) this on-disk cache.
+                On a hit the librosa pass is skipped, and get_audio_waveform() needn't be called beforehand.
+                A batch_analyze.TrackIndex can be given instead, to look the envelope up in a pre-analyzed library.
+            segment_frames (int): If given, the spectrogram is computed in segments of this many frames on
+                a thread pool, which bounds the memory for long tracks, with the same result
+            workers (int): How many threads compute the segments
+        """
 
-        self.__onset_env = rosa.onset.onset_strength(
-            self.__audio_waveform,
-            sr=self.__fs,
-            aggregate=np.mean)
+        self.__onset_env = None
+        self.__beat_grid = None
+        self.__track_beats = None
+        # the hop and the window at the analysis rate, a frame still spans hop_length samples of the file
+        sr, hop_length, n_fft = analysis_rate(self.__fs, self.__hop_length, analysis_sr=self.__analysis_sr)
+        if cache is not None:
+            key = cache.key(self.__audio_filename, sr, hop_length, self.__channel, np.mean)
+            self.__onset_env = cache.get(key)
+            if self.__onset_env is not None:
+                # a pre-analyzed library has the beats as well, which spares get_beat_grid() the beat tracking
+                self.__track_beats = cache.get_beats(key)
+
+        if self.__onset_env is None:
+            if segment_frames is None:
+                self.__onset_env = onset_envelope(self.__audio_waveform, sr, hop_length, n_fft)
+            else:
+                self.__onset_env = segmented_onset_envelope(self.__audio_waveform, sr, hop_length, n_fft,
+                                                            segment_frames=segment_frames, workers=workers)
+            if cache is not None:
+                cache.put(key, self.__onset_env)
+
+    def get_beat_grid(self, beats_per_bar=4):
+        """Class method for analyzing the beats of the audio file, after get_onset_envelope().
+
+        The tempo, the beats, the downbeats and the onset peaks are computed once, see
+        beat_grid.BeatGrid for the lookups into them. The tempo and the beats are taken
+        from the batch_analyze.TrackIndex the envelope came from, if it did.
 
-        # normalize the onset envelope
-        self.__onset_env /= np.max(self.__onset_env)
-        # convert onset array to list
-        self.__onset_env_list = self.__onset_env.tolist()
+        Args:
+            beats_per_bar (int): How many beats there are to a bar
+
+        Returns:
+            BeatGrid: The beat grid of the track
+        """
+
+        if self.__track_beats is not None:
+            tempo, beats = self.__track_beats
+            self.__beat_grid = BeatGrid.from_beats(tempo, beats, self.__onset_env, self.__fs, self.__hop_length,
+                                                   beats_per_bar)
+        else:
+            self.__beat_grid = BeatGrid.from_onset_envelope(self.__onset_env, self.__fs, self.__hop_length,
+                                                            beats_per_bar)
+        return self.__beat_grid
 
     def read_audio_chunk(self):
         self.__audio_input = self.__wf.readframes(self.__chunk)
@@ -117,48 +285,163 @@ class Pop_on_Beat:
 
         self.__wf.rewind()
         self.__audio_input = self.read_audio_chunk()
-        self.__cur_env = self.__onset_env_list[0: int(self.__chunk / self.__hop_length)]
+        self.__cur_env = self.__onset_env[0: int(self.__chunk / self.__hop_length)]
         self.__frame_count = 0
         self.__sensor_count = 0
         self.__force = 0
-        self.__fig.show()
+        self.__pop_log = [np.zeros(0)]
+        self.__pop_position = 0.
+        self.__pop_detector.reset()
+        self.__timers.reset()
+        if self.__rendered:
+            self.__fig.show()
 
     def update_audio_data(self):
         """Class method for updating the audio (onset) data."""
 
-        self.__yonset = self.__yonset[len(self.__cur_env):] + self.__cur_env
+        t = self.__timers.now()
+        self.__yonset.extend(self.__cur_env)
         self.__frame_count += 1
 
-        self.__line_onset.set_ydata(self.__yonset)
+        if self.__rendered:
+            self.__line_onset.set_ydata(self.__yonset.view())
         self.__stream.write(self.__audio_input)
         # self.__audio_input = self.read_audio_chunk()
 
-        if (self.__frame_count + 1) * self.__frames_per_chunk > len(self.__onset_env_list):
-            self.__cur_env = self.__onset_env_list[self.__frame_count * self.__frames_per_chunk:]
+        if (self.__frame_count + 1) * self.__frames_per_chunk > len(self.__onset_env):
+            self.__cur_env = self.__onset_env[self.__frame_count * self.__frames_per_chunk:]
         else:
-            self.__cur_env = self.__onset_env_list[
+            self.__cur_env = self.__onset_env[
                              self.__frame_count * self.__frames_per_chunk:
                              (self.__frame_count + 1) * self.__frames_per_chunk]
+        self.__timers.lap('audio', t)
 
     def update_sensor_data(self):
-        """Class method for updating the sensor data."""
+        """Class method for updating the sensor data, with every reading waiting at the serial input."""
+
+        t = self.__timers.now()
+        sensor_data = self.__ser.read(max(1, self.__ser.in_waiting))
+        forces = self.__decoder.decode(sensor_data)
 
-        sensor_data = self.__ser.readline()
-        data_string = sensor_data.strip().decode('UTF-8')
-        data_array = data_string.split(' ')
+        if len(forces) > 0:
+            self.__force = forces[-1]
+            self.__ysensor.extend(forces)
+            self.__detect_pops(forces)
+        self.__sensor_count += len(forces)
 
-        if data_array[0].isdigit():
-            self.__force = int(data_array[0])
-        self.__ysensor.append(self.__force)
+        if self.__rendered:
+            self.__line_sensor.set_ydata(self.__ysensor.view())
+        self.__timers.lap('sensor', t)
 
-        self.__sensor_count += 1
-        if len(self.__ysensor) > 50:
-            self.__ysensor.pop(0)
+    def __detect_pops(self, forces):
+        """Feed a batch of readings to the pop detector, timestamped with the audio played so far.
 
-        self.__line_sensor.set_ydata(self.__ysensor)
+        The readings arrived since the previous batch, so they are spread evenly from its
+        position up to the current one instead of all sharing the latter.
+        """
+
+        position = self.__frame_count * self.__chunk / float(self.__fs)
+        timestamps = np.linspace(self.__pop_position, position, len(forces), endpoint=False)
+        self.__pop_position = position
+        self.__pop_log.append(self.__pop_detector.process(timestamps, forces))
 
     def update_plot(self):
         """Class method for updating the (audio and sensor) plot."""
 
-        self.__fig.canvas.draw()
-        self.__fig.canvas.flush_events()
+        if not self.__rendered:
+            return
+        t = self.__timers.now()
+        self.__renderer.draw()
+        self.__timers.lap('plot', t)
+
+    def run_pipeline(self, sensor_capacity=65536, stats_path=None):
+        """Class method for playing the audio file with persistent worker processes instead of
+        the update_*() steps: one process plays the audio and one drains the serial input into
+        a shared memory ring buffer, while this process renders the plot.
+
+        The serial port and the audio stream of this object are handed over to the workers,
+        so call init_plot(), get_onset_envelope() and reinit_onset_plot() before, and nothing
+        that reads the serial input or plays audio after.
+
+        Args:
+            sensor_capacity (int): How many force readings the shared ring buffer holds
+            stats_path (str): If given, the per-stage latencies of the loop are written to this .csv or .json file
+
+        Raises:
+            RuntimeError: If the sensor worker failed (e.g. couldn't open the serial port), which stops the playback
+        """
+
+        if self.__replay is not None:
+            raise ValueError('The pipeline workers need the serial port and the sound card, '
+                             'replay with the update_*() steps instead')
+
+        # the workers open the serial port and the audio device themselves
+        serial_settings = dict(self.__ser.get_settings(), port=self.__ser.port, timeout=0.1)
+        self.__ser.close()
+        self.__stream.close()
+
+        sensor_buffer = SharedRingBuffer(sensor_capacity, np.int16)
+        position_queue = mp.Queue()
+        stop_event = mp.Event()
+        workers = [
+            mp.Process(target=_audio_worker,
+                       args=(self.__audio_filename, self.__chunk, position_queue, stop_event)),
+            mp.Process(target=_sensor_worker,
+                       args=(serial_settings, self.__protocol, sensor_buffer, stop_event)),
+        ]
+        for worker in workers:
+            worker.start()
+
+        sensor_count = 0
+        playing = True
+        try:
+            while playing:
+                loop_start = t = self.__timers.now()
+                # checked before draining the queue, so whatever it put before it exited is read
+                audio_exited = not workers[0].is_alive()
+                # advance the onset plot by the chunks played since the last frame
+                while True:
+                    try:
+                        position = position_queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if position is None:
+                        playing = False
+                        break
+                    self.__yonset.extend(self.__onset_env[self.__frame_count * self.__frames_per_chunk:
+                                                          position * self.__frames_per_chunk])
+                    self.__frame_count = position
+                if audio_exited and playing:
+                    # the audio worker died without saying so (e.g. killed), don't wait for it forever
+                    playing = False
+                self.__line_onset.set_ydata(self.__yonset.view())
+                t = self.__timers.lap('onset', t)
+
+                forces, sensor_count = sensor_buffer.read(sensor_count)
+                if len(forces) > 0:
+                    self.__force = forces[-1]
+                    self.__ysensor.extend(forces)
+                    self.__detect_pops(forces)
+                self.__sensor_count = sensor_count
+                if not workers[1].is_alive():
+                    # the sensor worker failed (or was killed before it could say so), end the playback
+                    stop_event.set()
+                self.__line_sensor.set_ydata(self.__ysensor.view())
+                self.__timers.lap('sensor', t)
+
+                self.__renderer.wait()
+                t = self.__timers.now()
+                self.__renderer.draw()
+                self.__timers.lap('render', t)
+                self.__timers.lap('loop', loop_start)
+        finally:
+            stop_event.set()
+            for worker in workers:
+                worker.join()
+            sensor_buffer.close()
+            if stats_path is not None:
+                self.__timers.dump(stats_path)
+        # a sensor worker that was only told to stop exits with 0
+        if workers[1].exitcode != 0:
+            raise RuntimeError('The sensor worker exited with code {0}, see its traceback above'.format(
+                workers[1].exitcode))
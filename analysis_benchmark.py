@@ -0,0 +1,77 @@
+"""Speed and accuracy of the onset analysis front end.
+
+For each channel selection the onset envelope is computed at the file's rate in
+float64 (the reference), then through the front end of track_analysis at the
+file's rate and at lower analysis rates, in float32 except for a single channel at
+the file's rate, which the front end passes through as it is (int16, analyzed in float64). Reports the time of each, the
+speedup and how far its envelope and its beats are from the reference, e.g.
+
+    python analysis_benchmark.py --audio West_Bubbles.wav --rates 22050 11025
+"""
+import time
+import argparse
+import numpy as np
+from wav_mmap import MappedWave
+from pop_align import beat_times
+from track_analysis import analysis_waveform, onset_envelope
+
+def timed(f, *args, repeat=3):
+    """The result of f(*args) and the fastest time (s) out of a few calls."""
+
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = f(*args)
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+def front_end_envelope(mapped_wave, channel, analysis_sr, hop_length):
+    analysis = analysis_waveform(mapped_wave, channel, analysis_sr, hop_length)
+    return onset_envelope(analysis.waveform, analysis.sr, analysis.hop_length, analysis.n_fft)
+
+def analyzed_dtype(mapped_wave, channel, analysis_sr, hop_length):
+    """The dtype front_end_envelope() analyzes in, integer samples are analyzed as float64."""
+
+    waveform = analysis_waveform(mapped_wave, channel, analysis_sr, hop_length).waveform
+    return waveform.dtype if np.issubdtype(waveform.dtype, np.floating) else np.dtype(np.float64)
+
+def compare(reference, onset_env, sr, hop_length, tolerance=0.05):
+    """Correlation and largest difference of two envelopes, and the fraction of the reference
+    beats with a beat of the other envelope within the tolerance (s)."""
+
+    n = min(len(reference), len(onset_env))
+    correlation = np.corrcoef(reference[:n], onset_env[:n])[0, 1]
+    max_error = np.max(np.abs(reference[:n] - onset_env[:n]))
+    _, reference_beats = beat_times(reference, sr, hop_length)
+    _, beats = beat_times(onset_env, sr, hop_length)
+    if len(beats) == 0 or len(reference_beats) == 0:
+        return correlation, max_error, 0.
+    nearest = np.min(np.abs(reference_beats[:, None] - beats[None, :]), axis=1)
+    return correlation, max_error, float(np.mean(nearest <= tolerance))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--audio', default='West_Bubbles.wav', help='WAV file to analyze')
+    parser.add_argument('--hop', type=int, default=512, help='hop length at the rate of the file')
+    parser.add_argument('--rates', type=int, nargs='*', default=[22050, 11025], help='analysis rates to compare')
+    parser.add_argument('--repeat', type=int, default=3, help='how many times each analysis is timed')
+    args = parser.parse_args()
+
+    mapped_wave = MappedWave(args.audio)
+    fs = mapped_wave.getframerate()
+    # the first librosa calls pay for the JIT compilation, the mel filter banks and the FFT plans
+    for rate in [None] + args.rates:
+        front_end_envelope(mapped_wave, 'mix', rate, args.hop)
+
+    for channel in ('right', 'mix'):
+        waveform = analysis_waveform(mapped_wave, channel, None, args.hop).waveform
+        reference, reference_time = timed(onset_envelope, np.asarray(waveform, dtype=np.float64), fs, args.hop,
+                                          repeat=args.repeat)
+        print('{0}, {1} Hz float64: {2:.0f} ms'.format(channel, fs, 1000 * reference_time))
+        for rate in [None] + args.rates:
+            onset_env, elapsed = timed(front_end_envelope, mapped_wave, channel, rate, args.hop, repeat=args.repeat)
+            correlation, max_error, beats_kept = compare(reference, onset_env, fs, args.hop)
+            dtype = analyzed_dtype(mapped_wave, channel, rate, args.hop)
+            print('  {0} Hz {1}: {2:.0f} ms ({3:.1f}x), correlation {4:.4f}, max error {5:.3f}, '
+                  'beats kept {6:.0%}'.format(rate or fs, dtype.name, 1000 * elapsed, reference_time / elapsed,
+                                              correlation, max_error, beats_kept))
@@ -0,0 +1,89 @@
+import time
+import numpy as np
+from collections import deque
+
+class AudioClock:
+    """The playback position of an output stream, as heard, on the time.monotonic() clock.
+
+    The read cursor of the audio file runs ahead of what is audible by the whole
+    output buffer. Instead, every stream callback stamps the offset (in frames) of
+    the buffer it hands over together with time_info['output_buffer_dac_time'], the
+    time its first frame reaches the DAC. The DAC time is on the stream's own clock,
+    so it is moved onto time.monotonic() through time_info['current_time'].
+
+    Every stamp gives the time the file started playing, monotonic-wise; the median
+    over the last few stamps smooths out the callback jitter, and the audio time at
+    any monotonic time (e.g. the timestamp of a sensor reading) follows from it at
+    the nominal sampling rate.
+    """
+
+    def __init__(self, sr, latency=0., window=32, clock=time.monotonic):
+        """Initialize the clock, see reset() for the time before the first stamp.
+
+        Args:
+            sr (int): Sampling rate of the audio
+            latency (float): Extra output latency (s) on top of the one the stream reports,
+                e.g. of an external amplifier or a Bluetooth speaker
+            window (int): Over how many stamps the start time is smoothed
+            clock (callable): The time base (s), e.g. the virtual one of a replay.ReplaySource
+        """
+
+        self.__sr = float(sr)
+        self.__clock = clock
+        self.latency = latency
+        self.__stream_latency = 0.
+        self.__starts = deque(maxlen=window)
+        self.__start = clock()
+
+    def reset(self, start=None, stream_latency=0.):
+        """Forget the stamps, e.g. before the file is played again.
+
+        Args:
+            start (float): Monotonic time the playback starts, assumed until the first stamp
+            stream_latency (float): Output latency (s) reported by the stream (get_output_latency()),
+                used for host APIs that don't provide the DAC times
+        """
+
+        self.__starts.clear()
+        self.__start = self.__clock() if start is None else start
+        self.__stream_latency = stream_latency
+
+    def stamp(self, frame, time_info):
+        """Record the buffer handed over by a stream callback (callback thread).
+
+        Args:
+            frame (int): Offset (in frames, from the start of the file) of the first frame of the buffer
+            time_info (dict): The time_info argument of the callback
+        """
+
+        now = self.__clock()
+        dac_time = time_info.get('output_buffer_dac_time', 0.) if time_info else 0.
+        current_time = time_info.get('current_time', 0.) if time_info else 0.
+        if dac_time > 0.:
+            dac_time = now + (dac_time - current_time)
+        else:
+            # no DAC time from this host API, the buffer is audible after the reported latency
+            dac_time = now + self.__stream_latency
+        self.__starts.append(dac_time - frame / self.__sr)
+
+    @property
+    def start(self):
+        """Monotonic time at which the first frame of the file is (or was) audible."""
+
+        starts = list(self.__starts)
+        start = np.median(starts) if starts else self.__start
+        return start + self.latency
+
+    def audio_time(self, t=None):
+        """Map monotonic time to the playback position.
+
+        Args:
+            t (float or np.ndarray): Monotonic time(s) (s), now by default
+
+        Returns:
+            float or np.ndarray: Position(s) (s) in the audio file audible at that time, negative before it starts
+        """
+
+        if t is None:
+            t = self.__clock()
+        return t - self.start
@@ -2,35 +2,68 @@ import pyaudio
 import wave
 import numpy as np
 import multiprocessing as mp
+from multiprocessing import shared_memory
 # from multiprocessing import Process
 import matplotlib.pyplot as plt
+from wav_mmap import MappedWave
+from onset_cache import OnsetCache
+from track_analysis import channel_waveform, onset_envelope
+from waveform_pyramid import WaveformPyramid
 
-duration = 5.0
+hop_length = 512
 filename = 'F:/My Documents/E-TATTOO/test_audio/Impeach_The_President.wav'
 wf = wave.open(filename,'rb')
 
 fs = wf.getframerate()
 bytes_per_sample = wf.getsampwidth()
-bits_per_sample  = bytes_per_sample * 8
-dtype = 'int{0}'.format(bits_per_sample)
 channels = wf.getnchannels()
 
-audio = np.fromstring(wf.readframes(int(duration*fs*bytes_per_sample/channels)), dtype=dtype)
-audio.shape = (audio.shape[0]//channels, channels)
+mapped_wave = MappedWave(filename)
+# the PCM as it's in the file, packed the way the stream plays it (3 bytes per sample for 24-bit audio)
+raw = mapped_wave.raw
+duration = mapped_wave.getnframes() / float(fs)
 ch_left = 0
 ch_right = 1
 ch = ch_right
-times = np.arange(audio.shape[0]) / float(fs)
-
-fig = plt.figure(figsize=(8, 4))
-plt.plot(times, audio[:, ch])
-plt.xlabel('Time (s)')
-plt.xlim(0, duration)
-plt.ylim(-32768, 32768)
-time_posn, = plt.plot([0,0], [-32768,32768], 'k')
+
+# the whole track, decimated to the plot width by min/max pyramids (the one of the waveform is
+# built by the plot process, see plotwaveform())
+cache = OnsetCache()
+key = cache.key(filename, fs, hop_length, 'right' if ch == ch_right else 'left')
+onset_env = cache.get(key)
+if onset_env is None:
+    onset_env = onset_envelope(channel_waveform(mapped_wave, 'right' if ch == ch_right else 'left'), fs, hop_length)
+    cache.put(key, onset_env)
+onset_pyramid = WaveformPyramid(onset_env, fs / float(hop_length))
+
+fig, (ax_wave, ax_onset) = plt.subplots(2, 1, sharex=True, figsize=(8, 4), gridspec_kw={'height_ratios': [3, 1]})
+wave_line, = ax_wave.plot([], [], lw=0.5)
+ax_wave.set_ylim(-32768, 32768)
+onset_line, = ax_onset.plot(*onset_pyramid.envelope(width=800), 'b', lw=0.5)
+ax_onset.set_ylim(0, 1)
+ax_onset.set_xlabel('Time (s)')
+ax_onset.set_xlim(0, duration)
+time_posn, = ax_wave.plot([0,0], [-32768,32768], 'k')
+onset_posn, = ax_onset.plot([0,0], [0,1], 'k')
 dt = .5
 
-def audiostream(queue, n_channels, sampling, n_bytes_per_sample):
+def follow_zoom(line, pyramid):
+    """ Redraw a line from its pyramid at the resolution of its axes whenever they are zoomed or panned """
+    def on_xlim_changed(ax):
+        t0, t1 = ax.get_xlim()
+        line.set_data(*pyramid.envelope(t0, t1, int(ax.get_window_extent().width)))
+    line.axes.callbacks.connect('xlim_changed', on_xlim_changed)
+    on_xlim_changed(line.axes)
+
+def chunk_bytes(chunk_dt, n_channels, sampling, n_bytes_per_sample):
+    """ Size (in bytes) of the chunks the audio is played in, whole frames """
+    return int(chunk_dt * sampling) * n_channels * n_bytes_per_sample
+
+def audiostream(queue, shm_name, n_bytes, chunk, n_channels, sampling, n_bytes_per_sample):
+    # the PCM of the track, put in shared memory once by the main process
+    shm = shared_memory.SharedMemory(name=shm_name)
+    pcm = shm.buf[:n_bytes].toreadonly()
+
     # open stream
     p = pyaudio.PyAudio()
 
@@ -40,61 +73,79 @@ def audiostream(queue, n_channels, sampling, n_bytes_per_sample):
                     rate = sampling,
                     output = True)
     stream.start_stream()
+    print("output latency: {0}".format(stream.get_output_latency()))
 
     while True:
-        data = queue.get()
-        print("input latency: {0}".format(stream.get_input_latency()))
-        print("output latency: {0}".format(stream.get_output_latency()))
-        print("avail read: {0}".format(stream.get_read_available()))
-        print("avail write: {0}".format(stream.get_write_available()))
-        if data == 'Stop':
+        # only the index of the chunk to play comes through the queue
+        i = queue.get()
+        if i is None:
             break
-        stream.write(data)
+        # written straight from the shared memory, no copy
+        stream.write(pcm[i * chunk:min((i + 1) * chunk, n_bytes)])
     # stream.stop_stream()
     stream.close()
+    pcm.release()
+    shm.close()
     # wf.close()
 
 class AudioSubsetter(object):
-    def __init__(self, audio_array, audio_device_queue, n_channels, sampling_rate, n_bytes_per_sample, chunk_dt=0.1):
+    def __init__(self, n_bytes, audio_device_queue, n_channels, sampling_rate, n_bytes_per_sample, chunk_dt=0.1):
         self.last_chunk = -1
         self.queue = audio_device_queue
-        self.audio_dat = audio_array.tostring()
         self.to_t = 1.0 / (sampling_rate * n_channels * n_bytes_per_sample)
-        chunk = int(chunk_dt * fs) * n_channels * bytes_per_sample
-        self.chunk0 = np.arange(0, len(self.audio_dat), chunk, dtype=int)
-        self.chunk1 = self.chunk0 + chunk
+        chunk = chunk_bytes(chunk_dt, n_channels, sampling_rate, n_bytes_per_sample)
+        self.chunk0 = np.arange(0, n_bytes, chunk, dtype=int)
+        self.chunk1 = np.minimum(self.chunk0 + chunk, n_bytes)
 
     def update(self, *args):
         """ Timer callback for audio position indicator. Called with """
         self.last_chunk += 1
         if self.last_chunk >= len(self.chunk0):
-            # self.queue.put("Stop")
+            # self.queue.put(None)
             self.last_chunk = 0
 
         i = self.last_chunk
         i0, i1 = self.chunk0[i], self.chunk1[i]
-        self.queue.put(self.audio_dat[i0:i1])
+        self.queue.put(i)
         t0, t1 = i0 * self.to_t, i1 * self.to_t
         print(t0, t1)
         for line_artist in args:
             line_artist.set_xdata([t1, t1])
         args[0].figure.canvas.draw()
 
-def plotwaveform(queue, subsetter, audio, n_channels, sampling, n_bytes_per_sample, dt, fig, cursor):
-    playhead = subsetter(audio, queue, n_channels, sampling, n_bytes_per_sample, chunk_dt=dt)
+def plotwaveform(queue, subsetter, n_bytes, n_channels, sampling, n_bytes_per_sample, dt, fig, cursors, traces,
+                 wave_trace):
+    playhead = subsetter(n_bytes, queue, n_channels, sampling, n_bytes_per_sample, chunk_dt=dt)
+    # the pyramid keeps the channel it's built from, so it's built here from the file mapped again,
+    # rather than sent over with the whole channel
+    wave_line, audio_filename, wave_channel = wave_trace
+    track = MappedWave(audio_filename)
+    traces = [(wave_line, WaveformPyramid(track.channel(wave_channel), sampling))] + list(traces)
+    # (line, pyramid) pairs; the callbacks don't survive the figure being sent to this process
+    for line, pyramid in traces:
+        follow_zoom(line, pyramid)
     timer = fig.canvas.new_timer(interval=dt * 1000.0)
-    timer.add_callback(playhead.update, cursor)
+    timer.add_callback(playhead.update, *cursors)
     timer.start()
     plt.show()
 
 if __name__ == '__main__':
+    # copy the PCM into shared memory once, the processes only exchange chunk indices
+    shm = shared_memory.SharedMemory(create=True, size=raw.nbytes)
+    np.ndarray(raw.shape, dtype=raw.dtype, buffer=shm.buf)[:] = raw
+
     Q = mp.Queue()
     audio_process = mp.Process(target=audiostream,
-                               args=(Q, channels, fs, bytes_per_sample))
+                               args=(Q, shm.name, raw.nbytes, chunk_bytes(dt, channels, fs, bytes_per_sample),
+                                     channels, fs, bytes_per_sample))
     waveform_process = mp.Process(target=plotwaveform,
-                                  args=(Q, AudioSubsetter, audio, channels, fs, bytes_per_sample, dt, fig, time_posn))
+                                  args=(Q, AudioSubsetter, raw.nbytes, channels, fs, bytes_per_sample, dt, fig,
+                                        (time_posn, onset_posn), [(onset_line, onset_pyramid)],
+                                        (wave_line, filename, ch)))
     audio_process.start()
     waveform_process.start()
     audio_process.join()
     waveform_process.join()
+    shm.close()
+    shm.unlink()
 
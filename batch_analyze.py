@@ -0,0 +1,251 @@
+"""Pre-analyze a music library, so that sessions start without a librosa pass.
+
+Walks a directory for WAV files, analyzes the new and modified ones on all cores and
+writes their onset envelopes, tempos and beat times to one compact index file, e.g.
+
+    python batch_analyze.py "F:/My Documents/pop_harder/test_audio"
+
+A session then looks its track up in the index instead of analyzing it:
+
+    session.get_onset_envelope(TrackIndex('F:/My Documents/pop_harder/test_audio/.onset_index.npz'))
+"""
+import os
+import argparse
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from track_analysis import TrackAnalysis, analyze_track
+
+INDEX_FILENAME = '.onset_index.npz'
+
+class TrackIndex:
+    """The analyses of a music library, in a single .npz file.
+
+    Tracks are stored by their path relative to the directory of the index, together
+    with their size and modification time, so that an entry can be told stale without
+    reading the audio. All tracks are analyzed with the same hop length and channel.
+
+    The index can stand in for an OnsetCache in get_onset_envelope() of the session
+    classes; it is only read that way, analyze_library() is what writes it.
+    """
+
+    def __init__(self, index_path, hop_length=512, channel='right'):
+        """Load the index, or start an empty one if there's none yet.
+
+        Args:
+            index_path (str): The index file
+            hop_length (int): By how many samples the frame is shifted, entries analyzed otherwise are dropped
+            channel (str): Which channel the audio is analyzed from, entries analyzed otherwise are dropped
+        """
+
+        self.__index_path = index_path
+        self.__root = os.path.dirname(os.path.abspath(index_path))
+        self.__hop_length = hop_length
+        self.__channel = channel
+        self.__entries = {}     # relative path -> (size, mtime_ns, TrackAnalysis)
+
+        if not os.path.exists(index_path):
+            return
+        with np.load(index_path) as data:
+            if int(data['hop_length']) != hop_length or str(data['channel']) != channel:
+                return
+            onset_bounds = data['onset_offsets']
+            beat_bounds = data['beat_offsets']
+            onsets = data['onsets']
+            beats = data['beats']
+            for i, path in enumerate(data['paths'].tolist()):
+                analysis = TrackAnalysis(int(data['srs'][i]),
+                                         onsets[onset_bounds[i]:onset_bounds[i + 1]],
+                                         float(data['tempos'][i]),
+                                         beats[beat_bounds[i]:beat_bounds[i + 1]])
+                self.__entries[path] = (int(data['sizes'][i]), int(data['mtimes'][i]), analysis)
+
+    def __len__(self):
+        return len(self.__entries)
+
+    @property
+    def root(self):
+        """The directory the track paths are relative to."""
+        return self.__root
+
+    def paths(self):
+        """Relative paths of the indexed tracks."""
+        return list(self.__entries)
+
+    def relpath(self, audio_filename):
+        return os.path.relpath(os.path.abspath(audio_filename), self.__root).replace(os.sep, '/')
+
+    def is_current(self, audio_filename):
+        """Whether a track is indexed and hasn't changed since.
+
+        Args:
+            audio_filename (str): The audio file
+        """
+
+        entry = self.__entries.get(self.relpath(audio_filename))
+        if entry is None:
+            return False
+        stat = os.stat(audio_filename)
+        return entry[0] == stat.st_size and entry[1] == stat.st_mtime_ns
+
+    def lookup(self, audio_filename):
+        """Get the analysis of a track, or None if it isn't indexed or has changed since.
+
+        Args:
+            audio_filename (str): The audio file
+        """
+
+        if not self.is_current(audio_filename):
+            return None
+        return self.__entries[self.relpath(audio_filename)][2]
+
+    def update(self, audio_filename, analysis):
+        """Store the analysis of a track (in memory, see save()).
+
+        Args:
+            audio_filename (str): The audio file
+            analysis (TrackAnalysis): Its analysis, see track_analysis.analyze_track()
+        """
+
+        stat = os.stat(audio_filename)
+        self.__entries[self.relpath(audio_filename)] = (stat.st_size, stat.st_mtime_ns, analysis)
+
+    def remove(self, path):
+        """Drop a track from the index (in memory, see save()).
+
+        Args:
+            path (str): Relative path of the track, as listed by paths()
+        """
+
+        del self.__entries[path]
+
+    def save(self):
+        """Write the index file."""
+
+        paths = sorted(self.__entries)
+        entries = [self.__entries[path] for path in paths]
+        analyses = [analysis for _, _, analysis in entries]
+        # every track's envelope and beats are concatenated, the offsets mark where each one starts
+        onset_offsets = np.cumsum([0] + [len(a.onset_env) for a in analyses])
+        beat_offsets = np.cumsum([0] + [len(a.beats) for a in analyses])
+
+        # write to a temporary file first so that a reader never sees a partial index
+        tmp_path = self.__index_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez_compressed(
+                f,
+                hop_length=self.__hop_length,
+                channel=self.__channel,
+                paths=np.array(paths, dtype=str),
+                sizes=np.array([size for size, _, _ in entries], dtype=np.int64),
+                mtimes=np.array([mtime for _, mtime, _ in entries], dtype=np.int64),
+                srs=np.array([a.sr for a in analyses], dtype=np.int64),
+                tempos=np.array([a.tempo for a in analyses], dtype=np.float64),
+                onset_offsets=onset_offsets,
+                onsets=np.concatenate([a.onset_env for a in analyses]).astype(np.float32) if analyses
+                       else np.zeros(0, dtype=np.float32),
+                beat_offsets=beat_offsets,
+                beats=np.concatenate([a.beats for a in analyses]) if analyses else np.zeros(0))
+        os.replace(tmp_path, self.__index_path)
+
+    def key(self, audio_filename, sr, hop_length, channel, aggregate=np.mean):
+        """Same as OnsetCache.key(), None when the index can't hold the envelope asked for.
+
+        The tracks are analyzed at their own rate, so the rate is kept in the key and checked
+        against the track's in get(): an envelope at another analysis rate has another frame rate.
+        """
+
+        if hop_length != self.__hop_length or channel != self.__channel or aggregate is not np.mean:
+            return None
+        return audio_filename, sr
+
+    def get(self, key):
+        """Same as OnsetCache.get(), the onset envelope of a track or None."""
+
+        if key is None:
+            return None
+        audio_filename, sr = key
+        analysis = self.lookup(audio_filename)
+        if analysis is None or analysis.sr != sr:
+            return None
+        return analysis.onset_env
+
+    def get_beats(self, key):
+        """Same as OnsetCache.get_beats(), the (tempo, beat times) of a track or None."""
+
+        if self.get(key) is None:
+            return None
+        analysis = self.lookup(key[0])
+        return analysis.tempo, analysis.beats
+
+    def put(self, key, onset_env):
+        """Same as OnsetCache.put(), but a no-op: the index is only written by analyze_library()."""
+        pass
+
+def find_tracks(directory):
+    """All WAV files under a directory, sorted."""
+
+    tracks = []
+    for dirpath, _, filenames in os.walk(directory):
+        for filename in filenames:
+            if filename.lower().endswith('.wav'):
+                tracks.append(os.path.join(dirpath, filename))
+    return sorted(tracks)
+
+def analyze_library(directory, index_path=None, hop_length=512, channel='right', workers=None):
+    """Analyze the WAV files of a directory which aren't in the index (or changed since) in parallel,
+    drop the ones which are gone, and save the index.
+
+    Args:
+        directory (str): The music library
+        index_path (str): The index file, .onset_index.npz in the directory by default
+        hop_length (int): By how many samples the frame is shifted
+        channel (str): Either 'left' or 'right', from which channel to get the audio waveform
+        workers (int): How many processes analyze at once, one per core by default
+
+    Returns:
+        (TrackIndex, list, list): The index, the tracks that were analyzed and the (track, error) that failed
+    """
+
+    if index_path is None:
+        index_path = os.path.join(directory, INDEX_FILENAME)
+    index = TrackIndex(index_path, hop_length, channel)
+
+    tracks = find_tracks(directory)
+    todo = [track for track in tracks if not index.is_current(track)]
+    present = set(index.relpath(track) for track in tracks)
+    for path in index.paths():
+        if path not in present:
+            index.remove(path)
+
+    analyzed, failed = [], []
+    if todo:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(analyze_track, track, hop_length, channel): track for track in todo}
+            for future in as_completed(futures):
+                track = futures[future]
+                try:
+                    index.update(track, future.result())
+                    analyzed.append(track)
+                except Exception as e:
+                    # e.g. an unsupported WAV format, the rest of the library is still worth indexing
+                    failed.append((track, e))
+    index.save()
+    return index, analyzed, failed
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('directory', help='music library to analyze')
+    parser.add_argument('--index', help='index file, {0} in the directory by default'.format(INDEX_FILENAME))
+    parser.add_argument('--hop-length', type=int, default=512, help='by how many samples the frame is shifted')
+    parser.add_argument('--channel', default='right', choices=['left', 'right'])
+    parser.add_argument('--workers', type=int, help='number of processes, one per core by default')
+    args = parser.parse_args()
+
+    index, analyzed, failed = analyze_library(args.directory, args.index, args.hop_length, args.channel, args.workers)
+    for track in analyzed:
+        analysis = index.lookup(track)
+        print('{0}: {1:.1f} bpm, {2} beats'.format(track, analysis.tempo, len(analysis.beats)))
+    for track, e in failed:
+        print('{0}: failed, {1}'.format(track, e))
+    print('{0} analyzed, {1} unchanged, {2} failed, {3} in the index'.format(
+        len(analyzed), len(index) - len(analyzed), len(failed), len(index)))
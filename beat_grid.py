@@ -0,0 +1,203 @@
+import numpy as np
+from pop_align import beat_times
+
+class BeatGrid:
+    """The beat structure of a track, precomputed once, with fast lookups for the live loop.
+
+    Holds the tempo and the sorted times (s) of the beats, of the downbeats (the first
+    beat of every bar) and of the onset peaks. Every lookup is a binary search over
+    these arrays, O(log n) and vectorized over arrays of query times; a BeatCursor
+    answers the non-decreasing queries of a session (e.g. the timestamp of every
+    sensor reading) in amortized O(1) instead.
+    """
+
+    def __init__(self, tempo, beats, downbeats, onsets):
+        """Initialize the grid from its arrays.
+
+        Args:
+            tempo (float): The tempo (bpm)
+            beats (np.ndarray): The sorted beat times (s)
+            downbeats (np.ndarray): The sorted downbeat times (s), a subset of the beats
+            onsets (np.ndarray or callable): The sorted onset peak times (s), or a function
+                returning them, which is only called once they are asked for
+        """
+
+        self.tempo = float(tempo)
+        self.beats = np.asarray(beats, dtype=np.float64)
+        self.downbeats = np.asarray(downbeats, dtype=np.float64)
+        self.__onsets = onsets
+        # a beat at either infinity spares every lookup the bounds checks
+        self.__padded_beats = np.concatenate(([-np.inf], self.beats, [np.inf]))
+        self.__bar_period = 4 * 60. / self.tempo if self.tempo > 0 else np.inf
+        if len(self.downbeats) > 1:
+            self.__bar_period = float(np.median(np.diff(self.downbeats)))
+
+    @classmethod
+    def from_onset_envelope(cls, onset_env, sr, hop_length=512, beats_per_bar=4):
+        """Analyze an onset envelope.
+
+        Args:
+            onset_env (np.ndarray): The onset envelope
+            sr (int): Sampling rate of the audio
+            hop_length (int): By how many samples the frame is shifted
+            beats_per_bar (int): How many beats there are to a bar
+
+        Returns:
+            BeatGrid: The beat grid of the track
+        """
+
+        tempo, beats = beat_times(np.asarray(onset_env), sr, hop_length)
+        return cls.from_beats(tempo, beats, onset_env, sr, hop_length, beats_per_bar)
+
+    @classmethod
+    def from_beats(cls, tempo, beats, onset_env, sr, hop_length=512, beats_per_bar=4):
+        """Build the grid around beats tracked beforehand, e.g. by batch_analyze.
+
+        The downbeats are taken as the beats of the bar position with the strongest
+        onsets on average, which is where the kick drum usually lands. Neither this
+        nor anything but the onset peaks (computed when first asked for) needs librosa.
+
+        Args:
+            tempo (float): The tempo (bpm)
+            beats (np.ndarray): The sorted beat times (s)
+            onset_env (np.ndarray): The onset envelope the beats were tracked in
+            sr (int): Sampling rate of the audio
+            hop_length (int): By how many samples the frame is shifted
+            beats_per_bar (int): How many beats there are to a bar
+
+        Returns:
+            BeatGrid: The beat grid of the track
+        """
+
+        onset_env = np.asarray(onset_env)
+        beats = np.asarray(beats, dtype=np.float64)
+        # the frame of each beat, as librosa.time_to_frames() has it
+        frames = np.minimum((beats * sr).astype(np.int64) // hop_length, len(onset_env) - 1)
+        strengths = [np.mean(onset_env[frames[phase::beats_per_bar]]) if len(frames) > phase else -np.inf
+                     for phase in range(beats_per_bar)]
+        downbeats = beats[int(np.argmax(strengths))::beats_per_bar]
+
+        def onsets():
+            import librosa as rosa
+            return rosa.onset.onset_detect(onset_envelope=onset_env, sr=sr, hop_length=hop_length, units='time')
+
+        return cls(tempo, beats, downbeats, onsets)
+
+    @property
+    def onsets(self):
+        """The sorted times (s) of the onset peaks."""
+
+        if callable(self.__onsets):
+            self.__onsets = self.__onsets()
+        return np.asarray(self.__onsets, dtype=np.float64)
+
+    def nearest_beat(self, t):
+        """Get the beat nearest to some time(s).
+
+        Args:
+            t (float or np.ndarray): The time(s) (s)
+
+        Returns:
+            float or np.ndarray: The time(s) (s) of the nearest beat(s)
+        """
+
+        padded = self.__padded_beats
+        right = np.searchsorted(padded, t)
+        before, after = padded[right - 1], padded[right]
+        return np.where(t - before <= after - t, before, after)[()]
+
+    def next_beat(self, t):
+        """Get the first beat at or after some time(s), inf past the last beat.
+
+        Args:
+            t (float or np.ndarray): The time(s) (s)
+
+        Returns:
+            float or np.ndarray: The time(s) (s) of the next beat(s)
+        """
+
+        return self.__padded_beats[np.searchsorted(self.__padded_beats, t)][()]
+
+    def bar_phase(self, t):
+        """Get the position within the bar at some time(s).
+
+        Before the first and after the last downbeat the bars are extended at the median bar length.
+
+        Args:
+            t (float or np.ndarray): The time(s) (s)
+
+        Returns:
+            float or np.ndarray: The phase(s), from 0 on the downbeat up to 1 at the next one
+        """
+
+        downbeats = self.downbeats
+        if len(downbeats) == 0:
+            return np.zeros_like(t, dtype=np.float64) if np.ndim(t) else 0.
+        bar = np.searchsorted(downbeats, t, side='right') - 1
+        start = np.where(bar >= 0, downbeats[np.maximum(bar, 0)], downbeats[0] - self.__bar_period)
+        length = np.where((bar >= 0) & (bar < len(downbeats) - 1),
+                          downbeats[np.minimum(bar + 1, len(downbeats) - 1)] - start, self.__bar_period)
+        return np.mod((np.asarray(t) - start) / length, 1.)
+
+    def cursor(self):
+        """Get a BeatCursor over this grid, for non-decreasing queries."""
+        return BeatCursor(self)
+
+class BeatCursor:
+    """Scalar lookups into a BeatGrid for query times that mostly go forward.
+
+    The cursor remembers the beat and the bar of the last query and steps forward
+    from them, so a session's worth of non-decreasing queries costs O(1) each on
+    average. A query earlier than the previous one starts over with a binary search.
+    """
+
+    def __init__(self, grid):
+        """Initialize the cursor at the start of the track.
+
+        Args:
+            grid (BeatGrid): The grid to look up
+        """
+
+        self.__grid = grid
+        self.__beats = np.concatenate(([-np.inf], grid.beats, [np.inf])).tolist()
+        self.__downbeats = grid.downbeats.tolist()
+        self.__beat = 1
+        self.__bar = -1
+        self.__last = -np.inf
+
+    def __seek(self, t):
+        """Move to the first beat at or after t, and to the last downbeat at or before t."""
+
+        if t < self.__last:
+            self.__beat = int(np.searchsorted(self.__beats, t))
+            self.__bar = int(np.searchsorted(self.__downbeats, t, side='right')) - 1
+        else:
+            beats, downbeats = self.__beats, self.__downbeats
+            while beats[self.__beat] < t:
+                self.__beat += 1
+            while self.__bar + 1 < len(downbeats) and downbeats[self.__bar + 1] <= t:
+                self.__bar += 1
+        self.__last = t
+
+    def nearest_beat(self, t):
+        """See BeatGrid.nearest_beat(), for a single time."""
+
+        self.__seek(t)
+        before, after = self.__beats[self.__beat - 1], self.__beats[self.__beat]
+        return before if t - before <= after - t else after
+
+    def next_beat(self, t):
+        """See BeatGrid.next_beat(), for a single time."""
+
+        self.__seek(t)
+        return self.__beats[self.__beat]
+
+    def bar_phase(self, t):
+        """See BeatGrid.bar_phase(), for a single time."""
+
+        self.__seek(t)
+        downbeats = self.__downbeats
+        if 0 <= self.__bar < len(downbeats) - 1:
+            return (t - downbeats[self.__bar]) / (downbeats[self.__bar + 1] - downbeats[self.__bar])
+        # outside of the downbeats, as extrapolated by the grid
+        return float(self.__grid.bar_phase(t))
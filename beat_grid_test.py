@@ -0,0 +1,68 @@
+import time
+import numpy as np
+from onset_cache import OnsetCache
+from wav_mmap import MappedWave
+from track_analysis import channel_waveform, onset_envelope
+from beat_grid import BeatGrid
+
+filename = 'West_Bubbles.wav'
+hop_length = 512
+
+mapped_wave = MappedWave(filename)
+fs = mapped_wave.getframerate()
+cache = OnsetCache()
+key = cache.key(filename, fs, hop_length, 'right')
+onset_env = cache.get(key)
+if onset_env is None:
+    onset_env = onset_envelope(channel_waveform(mapped_wave, 'right'), fs, hop_length)
+    cache.put(key, onset_env)
+grid = BeatGrid.from_onset_envelope(onset_env, fs, hop_length)
+
+rng = np.random.RandomState(0)
+queries = np.sort(rng.uniform(-1, len(onset_env) * hop_length / float(fs) + 1, 5000))
+
+def test_grid_matches_brute_force():
+    nearest = grid.nearest_beat(queries)
+    distances = np.abs(queries[:, None] - grid.beats[None, :])
+    assert np.array_equal(np.abs(queries - nearest), distances.min(axis=1))
+
+    following = grid.next_beat(queries)
+    for t, beat in zip(queries[::50], following[::50]):
+        later = grid.beats[grid.beats >= t]
+        assert beat == (later[0] if len(later) else np.inf)
+
+    phases = grid.bar_phase(queries)
+    assert np.all((phases >= 0) & (phases < 1))
+    assert np.allclose(grid.bar_phase(grid.downbeats[:-1]), 0)
+
+def test_downbeats_are_beats():
+    assert len(grid.downbeats) > 0
+    assert np.all(np.isin(grid.downbeats, grid.beats))
+
+def test_cursor_matches_grid():
+    # forward, then a jump back
+    for times in (queries, np.concatenate((queries[:100], queries[:100]))):
+        cursor = grid.cursor()
+        for t in times:
+            assert cursor.nearest_beat(t) == grid.nearest_beat(t)
+            assert cursor.next_beat(t) == grid.next_beat(t)
+            assert np.isclose(cursor.bar_phase(t), grid.bar_phase(t))
+
+def test_grid_from_tracked_beats_matches():
+    # e.g. the tempo and the beats of a batch_analyze.TrackIndex
+    tracked = BeatGrid.from_beats(grid.tempo, grid.beats, onset_env, fs, hop_length)
+    assert tracked.tempo == grid.tempo
+    assert np.array_equal(tracked.downbeats, grid.downbeats)
+    assert np.array_equal(tracked.onsets, grid.onsets)
+
+if __name__ == '__main__':
+    print('tempo {0:.1f} bpm, {1} beats, {2} bars, {3} onsets'.format(
+        grid.tempo, len(grid.beats), len(grid.downbeats), len(grid.onsets)))
+    start = time.perf_counter()
+    grid.nearest_beat(queries)
+    print('vectorized: {0:.3f} us per query'.format(1e6 * (time.perf_counter() - start) / len(queries)))
+    cursor = grid.cursor()
+    start = time.perf_counter()
+    for t in queries.tolist():
+        cursor.nearest_beat(t)
+    print('cursor: {0:.3f} us per query'.format(1e6 * (time.perf_counter() - start) / len(queries)))
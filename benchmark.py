@@ -0,0 +1,260 @@
+"""Headless benchmark of the Dance2Music and Pop_on_Beat loops.
+
+Runs both classes end to end without a sensor or a sound card: the sensor is
+emulated on a pseudo-terminal, the audio goes to a null pyaudio sink and the
+plots are rendered with the Agg backend. Reports loops/sec, latency
+percentiles per stage, and the sensor samples still in flight (sent but not yet
+read at the end of the run) and dropped (by a full acquisition queue), e.g.
+
+    python benchmark.py --seconds 10 --speed 4 --protocol binary
+    python benchmark.py --dancers 8
+"""
+import os
+import pty
+import time
+import argparse
+import threading
+import warnings
+import numpy as np
+import matplotlib
+matplotlib.use('Agg')
+from sensor_protocol import encode_readings
+from onset_cache import OnsetCache
+
+paContinue = 0
+paComplete = 1
+paOutputUnderflow = 4
+
+class FakeSensor:
+    """An emulated e-tattoo sensor on a pseudo-terminal, popping on a steady tempo."""
+
+    def __init__(self, rate=500, bpm=100, protocol='ascii', batch_dt=0.005):
+        """Open the pseudo-terminal.
+
+        Args:
+            rate (int): How many readings are sent per second
+            bpm (float): Tempo of the pops
+            protocol (str): Either 'ascii' or 'binary', see sensor_protocol
+            batch_dt (float): Interval (s) between writes to the terminal
+        """
+
+        self.__rate = rate
+        self.__period = 60.0 / bpm
+        self.__protocol = protocol
+        self.__batch_dt = batch_dt
+        self.__master, self.__slave = pty.openpty()
+        os.set_blocking(self.__master, False)
+        self.__sent = 0
+        self.__overflow = 0
+        self.__running = threading.Event()
+
+    @property
+    def port(self):
+        """Name of the serial port to open."""
+        return os.ttyname(self.__slave)
+
+    @property
+    def sent(self):
+        """How many readings were sent."""
+        return self.__sent
+
+    @property
+    def overflow(self):
+        """How many readings didn't fit into the terminal buffer, because nobody read them."""
+        return self.__overflow
+
+    def __run(self):
+        start = time.monotonic()
+        while self.__running.is_set():
+            due = int((time.monotonic() - start) * self.__rate)
+            t = (np.arange(self.__sent + self.__overflow, due) / float(self.__rate)) % self.__period
+            # a pop lasts 50 ms, the rest is the resting force with a little noise
+            forces = np.where(t < 0.05, 900, 100) + np.random.randint(0, 20, len(t))
+            try:
+                os.write(self.__master, encode_readings(forces, self.__protocol))
+                self.__sent += len(forces)
+            except BlockingIOError:
+                self.__overflow += len(forces)
+            time.sleep(self.__batch_dt)
+
+    def start(self):
+        self.__running.set()
+        threading.Thread(target=self.__run, daemon=True).start()
+
+    def stop(self):
+        self.__running.clear()
+
+class NullStream:
+    """A pyaudio.Stream look-alike that discards the audio, in real time (or faster).
+
+    In callback mode a thread calls the callback every frames_per_buffer frames; like
+    PortAudio, the stream finishes when the callback returns paComplete or short data,
+    and a buffer reaches the (imaginary) DAC two buffers after its callback. A callback
+    that comes later than that is flagged as an output underflow.
+    """
+
+    def __init__(self, rate, channels, width, stream_callback=None, frames_per_buffer=1024,
+                 speed=1.0, max_seconds=None):
+        self.__rate = rate
+        self.__bytes_per_frame = channels * width
+        self.__callback = stream_callback
+        self.__frames_per_buffer = frames_per_buffer
+        self.__speed = speed
+        self.__max_frames = None if max_seconds is None else int(max_seconds * rate)
+        self.__frames = 0
+        self.__active = False
+
+    def __run(self):
+        start = time.monotonic()
+        while self.__active:
+            now = time.monotonic()
+            late = now - (start + self.__frames / float(self.__rate * self.__speed))
+            status = paOutputUnderflow if late > self.get_output_latency() else 0
+            time_info = {'current_time': now, 'output_buffer_dac_time': now + self.get_output_latency()}
+            data, flag = self.__callback(None, self.__frames_per_buffer, time_info, status)
+
+            self.__frames += len(data) // self.__bytes_per_frame
+            if flag == paComplete or len(data) < self.__frames_per_buffer * self.__bytes_per_frame or \
+                    (self.__max_frames is not None and self.__frames >= self.__max_frames):
+                self.__active = False
+                break
+            # pace the callbacks like a sound card playing at the given speed
+            time.sleep(max(0., start + self.__frames / float(self.__rate * self.__speed) - time.monotonic()))
+
+    def start_stream(self):
+        self.__active = True
+        if self.__callback is not None:
+            threading.Thread(target=self.__run, daemon=True).start()
+
+    def is_active(self):
+        return self.__active
+
+    def get_output_latency(self):
+        return 2 * self.__frames_per_buffer / float(self.__rate * self.__speed)
+
+    def write(self, frames):
+        n = len(frames) // self.__bytes_per_frame
+        self.__frames += n
+        time.sleep(n / float(self.__rate * self.__speed))
+
+    def stop_stream(self):
+        self.__active = False
+
+    def close(self):
+        self.__active = False
+
+class NullPyAudio:
+    """A pyaudio.PyAudio look-alike whose streams are NullStreams."""
+
+    def __init__(self, speed=1.0, max_seconds=None):
+        self.__speed = speed
+        self.__max_seconds = max_seconds
+        self.streams = []
+
+    def get_format_from_width(self, width):
+        return width
+
+    def open(self, format, channels, rate, output=False, input=False, stream_callback=None,
+             frames_per_buffer=1024, **kwargs):
+        stream = NullStream(rate, channels, format, stream_callback, frames_per_buffer,
+                            self.__speed, self.__max_seconds)
+        if stream_callback is None:
+            # blocking streams are ready to write right away
+            stream.start_stream()
+        self.streams.append(stream)
+        return stream
+
+    def terminate(self):
+        pass
+
+def report(name, seconds, timers, sent, received, dropped=None, xruns=None, pop_detectors=()):
+    print(name)
+    print('  loops/sec      {0:.1f}'.format(timers.histogram('loop').count / seconds))
+    for stage, stats in timers.summary().items():
+        if stats['count'] == 0:
+            print('  {0:<14} no samples'.format(stage))
+            continue
+        print('  {0:<14} p50 {1:.2f}  p90 {2:.2f}  p99 {3:.2f}  max {4:.2f} ms'.format(
+            stage, stats['p50_ms'], stats['p90_ms'], stats['p99_ms'], stats['max_ms']))
+    # one count per sensor; without an acquisition queue (dropped is None) nothing is dropped on the way
+    sent, received = np.atleast_1d(sent), np.atleast_1d(received)
+    dropped = [None] * len(sent) if dropped is None else np.atleast_1d(dropped)
+    for i, (n_sent, n_received, n_dropped) in enumerate(zip(sent, received, dropped)):
+        label = 'readings' if len(sent) == 1 else 'readings #{0}'.format(i + 1)
+        print('  {0:<14} {1} sent, {2} received, {3} in flight{4}'.format(
+            label, n_sent, n_received, max(0, n_sent - n_received),
+            '' if n_dropped is None else ', {0} dropped'.format(n_dropped)))
+    for i, pop_detector in enumerate(pop_detectors):
+        label = 'pops' if len(pop_detectors) == 1 else 'pops #{0}'.format(i + 1)
+        print('  {0:<14} {1} detected, {2:.2f} M readings/s'.format(
+            label, pop_detector.count, pop_detector.samples_per_sec / 1e6))
+    if xruns is not None:
+        print('  xruns          {0}'.format(', '.join('{0} {1}'.format(n, kind) for kind, n in xruns.items())))
+
+def bench_dance2music(audio_filename, seconds, speed, rate, protocol, fps, frames_per_buffer, dancers=1):
+    from dance2music import Dance2Music
+
+    sensors = [FakeSensor(rate=rate, protocol=protocol) for _ in range(dancers)]
+    pa = NullPyAudio(speed=speed, max_seconds=seconds * speed)
+    ports = [sensor.port for sensor in sensors]
+    session = Dance2Music(ports if dancers > 1 else ports[0], 19200, audio_filename, protocol=protocol,
+                          fps=fps, pa=pa)
+    session.get_audio_waveform()
+    session.get_onset_envelope(OnsetCache())
+
+    for sensor in sensors:
+        sensor.start()
+    start = time.perf_counter()
+    session.get_down(frames_per_buffer=frames_per_buffer)
+    elapsed = time.perf_counter() - start
+    for sensor in sensors:
+        sensor.stop()
+
+    received = [len(session.get_sensor_log(i)[1]) for i in range(dancers)]
+    report('Dance2Music.get_down', elapsed, session.timers, [sensor.sent for sensor in sensors], received,
+           session.dropped, session.xruns, session.pop_detectors)
+
+def bench_pop_on_beat(audio_filename, seconds, speed, rate, protocol):
+    from Pop_on_Beat import Pop_on_Beat
+
+    sensor = FakeSensor(rate=rate, protocol=protocol)
+    pa = NullPyAudio(speed=speed)
+    session = Pop_on_Beat(sensor.port, 19200, audio_filename, protocol=protocol, pa=pa)
+    session.init_plot()
+    session.get_audio_waveform()
+    session.get_onset_envelope(OnsetCache())
+    session.reinit_onset_plot()
+
+    # the update_*() steps time themselves, the loop around them is timed here
+    timers = session.timers
+    sensor.start()
+    start = time.perf_counter()
+    while len(session.read_audio_chunk()) > 0 and time.perf_counter() - start < seconds:
+        loop_start = timers.now()
+        session.update_audio_data()
+        session.update_sensor_data()
+        session.update_plot()
+        timers.lap('loop', loop_start)
+    elapsed = time.perf_counter() - start
+    sensor.stop()
+
+    report('Pop_on_Beat update loop', elapsed, timers, sensor.sent, session.sensor_count,
+           pop_detectors=[session.pop_detector])
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--audio', default='West_Bubbles.wav', help='WAV file to play')
+    parser.add_argument('--seconds', type=float, default=10., help='wall-clock duration of each run')
+    parser.add_argument('--speed', type=float, default=1., help='playback speed of the null audio sink')
+    parser.add_argument('--rate', type=int, default=500, help='readings per second of the fake sensor')
+    parser.add_argument('--protocol', default='ascii', choices=['ascii', 'binary'])
+    parser.add_argument('--fps', type=float, default=1000., help='frame rate cap of the Dance2Music plot')
+    parser.add_argument('--buffer', type=int, default=1024, help='frames per buffer of the Dance2Music audio stream')
+    parser.add_argument('--dancers', type=int, default=1, help='how many fake sensors Dance2Music reads at once')
+    args = parser.parse_args()
+
+    # plt.show() & co. warn that Agg is non-interactive
+    warnings.simplefilter('ignore', UserWarning)
+    bench_dance2music(args.audio, args.seconds, args.speed, args.rate, args.protocol, args.fps, args.buffer,
+                      args.dancers)
+    bench_pop_on_beat(args.audio, args.seconds, args.speed, args.rate, args.protocol)
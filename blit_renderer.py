@@ -0,0 +1,123 @@
+import time
+
+class BlitRenderer:
+    """A frame-rate-capped plot renderer that only redraws the artists which change.
+
+    The static part of the figure (axes, ticks, labels) is drawn once and cached;
+    every frame restores that background and blits the animated artists on top of
+    it. Frames requested faster than the target rate are skipped, and when the
+    renderer falls behind it drops the missed frames instead of catching up.
+    """
+
+    def __init__(self, fig, artists, fps=60, show_fps=False):
+        """Initialize the renderer, the background is cached on the first frame.
+
+        Args:
+            fig (matplotlib.figure.Figure): The figure to render
+            artists (list): The artists (e.g. Line2D) that are updated between frames
+            fps (float): Target frame rate
+            show_fps (bool): Whether to show the frame rate and frame time in the corner of the figure
+        """
+
+        self.__fig = fig
+        self.__canvas = fig.canvas
+        self.__artists = list(artists)
+        self.__period = 1.0 / fps
+        self.__background = None
+
+        self.__fps_text = None
+        if show_fps:
+            self.__fps_text = fig.text(0.01, 0.99, '', va='top', ha='left', fontsize='small')
+            self.__artists.append(self.__fps_text)
+
+        for artist in self.__artists:
+            artist.set_animated(True)
+
+        # frame statistics (exponential moving averages)
+        self.__next_frame = 0.
+        self.__last_frame = None
+        self.__frame_interval = self.__period
+        self.__frame_time = 0.
+        self.__dropped = 0
+
+        # recapture the background whenever the whole figure is redrawn, e.g. on resize
+        self.__cid = self.__canvas.mpl_connect('draw_event', self.__on_draw)
+
+    @property
+    def fps(self):
+        """Measured frame rate."""
+        return 1.0 / self.__frame_interval if self.__frame_interval > 0 else 0.
+
+    @property
+    def frame_time(self):
+        """Measured time (s) to render one frame."""
+        return self.__frame_time
+
+    @property
+    def dropped(self):
+        """How many frames were dropped because rendering fell behind the target rate."""
+        return self.__dropped
+
+    def __on_draw(self, event):
+        """Callback of a full redraw: cache the new background and draw the artists on top of it."""
+
+        self.__background = self.__canvas.copy_from_bbox(self.__fig.bbox)
+        self.__draw_artists()
+
+    def __draw_artists(self):
+        for artist in self.__artists:
+            self.__fig.draw_artist(artist)
+
+    def wait(self):
+        """Sleep until it's time for the next frame."""
+
+        delay = self.__next_frame - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+    def draw(self, block=False):
+        """Render a frame, if it's time for one.
+
+        Args:
+            block (bool): Wait for the next frame instead of skipping it when called too early
+
+        Returns:
+            bool: Whether a frame was rendered
+        """
+
+        if block:
+            self.wait()
+        now = time.perf_counter()
+        if now < self.__next_frame:
+            return False
+
+        if self.__background is None:
+            # first frame: full draw, which fires draw_event and caches the background
+            self.__canvas.draw()
+        else:
+            self.__canvas.restore_region(self.__background)
+            self.__draw_artists()
+            self.__canvas.blit(self.__fig.bbox)
+        self.__canvas.flush_events()
+
+        # schedule the next frame, dropping the ones that were missed
+        self.__next_frame += self.__period
+        if self.__next_frame < now:
+            if self.__last_frame is not None:
+                self.__dropped += int((now - self.__next_frame) / self.__period)
+            self.__next_frame = now + self.__period
+
+        done = time.perf_counter()
+        self.__frame_time = 0.9 * self.__frame_time + 0.1 * (done - now)
+        if self.__last_frame is not None:
+            self.__frame_interval = 0.9 * self.__frame_interval + 0.1 * (now - self.__last_frame)
+        self.__last_frame = now
+
+        if self.__fps_text is not None:
+            # shown from the next frame on
+            self.__fps_text.set_text('{0:.0f} fps, {1:.1f} ms/frame'.format(self.fps, 1000 * self.__frame_time))
+        return True
+
+    def close(self):
+        """Stop tracking full redraws of the figure."""
+        self.__canvas.mpl_disconnect(self.__cid)
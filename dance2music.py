@@ -1,9 +1,32 @@
-import serial
-import pyaudio
-import librosa as rosa
-import wave
+import time
 import numpy as np
-import matplotlib.pyplot as plt
+from collections import deque
+from wav_mmap import MappedWave
+from track_analysis import analysis_rate, analysis_waveform, onset_envelope, segmented_onset_envelope
+from onset_stream import StreamingOnsetStrength
+from ring_buffer import RingBuffer
+from serial_acquire import MultiSerialAcquisition
+from sensor_protocol import make_decoder
+from pop_align import score_alignment, estimate_offset
+from blit_renderer import BlitRenderer
+from instrument import StageTimer
+from audio_clock import AudioClock
+from session_recorder import SessionRecorder
+from pop_detector import PopDetector
+from beat_grid import BeatGrid
+
+# PortAudio constants, so that pyaudio is only imported once a sound card is opened
+paContinue = 0
+paComplete = 1
+paInt16 = 8
+
+# status flags of the stream callbacks that mean a glitch
+XRUN_FLAGS = {
+    'input_underflow': 1,   # paInputUnderflow
+    'input_overflow': 2,    # paInputOverflow
+    'output_underflow': 4,  # paOutputUnderflow
+    'output_overflow': 8,   # paOutputOverflow
+}
 
 class Dance2Music:
     """A class that detects beats and/or onsets in audio signal and 'pop' signal from sensor
@@ -12,140 +35,577 @@ class Dance2Music:
     Copyright 2018 Yanwen Xiong
     """
 
-    def __init__(self, serial_port, baud_rate, audio_filename, chunk=2048, hop_length=512, data_on_graph=200):
+    def __init__(self, serial_port, baud_rate, audio_filename, chunk=2048, hop_length=512, data_on_graph=200,
+                 protocol='ascii', fps=60, show_fps=False, pa=None, show_stats=False,
+                 output_latency=0., sensor_latency=0., replay=None):
         """Initialize serial input, plot handle, wave object and audio stream etc.
 
         Args:
-            serial_port (str): From which serial port the sensor data is input
+            serial_port (str or list): From which serial port the sensor data is input, or a list of ports
+                for group practice, one sensor (dancer) on each
             baud_rate (int): baud rate of serial input
             audio_filename (str): From which file to read the audio
             chunk (int): The chunk (frame) length (in # of samples)
             hop_length (int): By how many samples the frame is shifted
+            data_on_graph (int): How many data points to be shown on the graph
+            protocol (str): Either 'ascii' (one reading per text line) or 'binary' (compact frames, see sensor_protocol)
+            fps (float): Target frame rate of the plot
+            show_fps (bool): Whether to show the measured frame rate on the plot
+            pa (pyaudio.PyAudio): Audio interface to play through, a new pyaudio.PyAudio() by default
+            show_stats (bool): Whether to show the latency of each stage of the loop on the plot
+            output_latency (float): Extra audio output latency (s) on top of the one the sound card reports
+            sensor_latency (float): Delay (s) between a pop and the arrival of its reading, see calibrate()
+            replay (replay.ReplaySource): If given, a captured sensor trace is replayed in place of the serial
+                input and the audio goes to its clock instead of a sound card; serial_port, baud_rate and pa are
+                ignored. A replay as fast as possible isn't rendered.
         """
 
         self.__chunk = chunk
         self.__hop_length = hop_length
         self.__frames_per_chunk = int(self.__chunk / self.__hop_length)
-
-        # initialize serial input
-        self.__ser = serial.Serial(
-            port=serial_port,
-            baudrate=baud_rate,
-            parity=serial.PARITY_ODD,
-            stopbits=serial.STOPBITS_TWO,
-            bytesize=serial.SEVENBITS)
+        self.__audio_filename = audio_filename
+        self.__channel = 'right'
+        self.__analysis_sr = None
+
+        # per-stage latency histograms, all stages are known up front as the callback runs on another thread
+        self.__timers = StageTimer(('audio_callback', 'onset', 'sensor', 'render', 'loop'))
+
+        # the time base of the session, which a replay runs on its own
+        self.__now = time.monotonic if replay is None else replay.now
+        self.__rendered = replay is None or replay.realtime
+
+        if replay is None:
+            import serial
+            ports = [serial_port] if isinstance(serial_port, str) else list(serial_port)
+            # initialize serial input
+            self.__sers = [serial.Serial(
+                port=port,
+                baudrate=baud_rate,
+                parity=serial.PARITY_ODD,
+                stopbits=serial.STOPBITS_TWO,
+                bytesize=serial.EIGHTBITS if protocol == 'binary' else serial.SEVENBITS,
+                timeout=0.1) for port in ports]
+            # drains the serial inputs in the background while the plot is drawn
+            self.__acquisition = MultiSerialAcquisition(self.__sers, [make_decoder(protocol) for _ in ports],
+                                                        clock=self.__now)
+        else:
+            self.__sers = [replay.serial]
+            self.__acquisition = replay.acquisition(make_decoder(protocol))
+            pa = replay.pa
+        self.__n_dancers = len(self.__sers)
+        self.__forces = [0] * self.__n_dancers
+        # turn the force streams into pop events as they arrive
+        self.__pop_detectors = [PopDetector() for _ in range(self.__n_dancers)]
+        self.__beat_grid = None
+        self.__track_beats = None
 
         # initialize plot handle, call __init_plot() method
-        self.__init_plot(data_on_graph)
+        self.__init_plot(data_on_graph, fps, show_fps, show_stats)
+
+        # initialize wave object, the audio is played from (and analysed in) the memory-mapped file
+        self.__mapped_wave = MappedWave(audio_filename)
+        self.__fs = self.__mapped_wave.getframerate() # sampling rate
+        self.__bytes_per_frame = self.__mapped_wave.getnchannels() * self.__mapped_wave.getsampwidth()
+        self.__play_pos = 0
+        self.__xruns = dict.fromkeys(XRUN_FLAGS, 0)
 
-        # initialize wave object
-        self.__wf = wave.open(audio_filename, 'rb')
-        self.__fs = self.__wf.getframerate() # sampling rate
+        # what's audible when, the envelope and the sensor readings are both placed on this clock
+        self.__clock = AudioClock(self.__fs, output_latency, clock=self.__now)
+        self.__sensor_latency = sensor_latency
 
         # initialize audio stream
-        self.__p = pyaudio.PyAudio()
+        if pa is None:
+            import pyaudio
+            pa = pyaudio.PyAudio()
+        self.__p = pa
 
-    def __init_plot(self, data_on_graph):
+    def __init_plot(self, data_on_graph, fps, show_fps, show_stats):
         """Internal class method for initializing the plots.
 
         Args:
             data_on_graph (int): How many data points to be shown on the graph
+            fps (float): Target frame rate of the plot
+            show_fps (bool): Whether to show the measured frame rate on the plot
+            show_stats (bool): Whether to show the latency of each stage of the loop on the plot
         """
 
+        self.__ysensors = [RingBuffer(data_on_graph) for _ in range(self.__n_dancers)]
+        self.__yonset = RingBuffer(data_on_graph)
+        if not self.__rendered:
+            # nothing is drawn, so matplotlib isn't even imported
+            return
+
+        import matplotlib.pyplot as plt
         self.__fig, (self.__ax_sensor, self.__ax_onset) = plt.subplots(nrows=2, ncols=1, sharex=False)
 
-        # initialize sensor data plot
+        # initialize sensor data plot, a line per dancer
         self.__ax_sensor.set_ylim(0, 1023)
-        self.__ysensor = data_on_graph * [0.0]
-        self.__line_sensor, = self.__ax_sensor.plot(self.__ysensor, 'r-')
+        if self.__n_dancers == 1:
+            self.__lines_sensor = self.__ax_sensor.plot(self.__ysensors[0].view(), 'r-')
+        else:
+            self.__lines_sensor = [self.__ax_sensor.plot(ysensor.view(), label='dancer {0}'.format(i + 1))[0]
+                                   for i, ysensor in enumerate(self.__ysensors)]
+            self.__ax_sensor.legend(loc='upper left', fontsize='x-small')
 
         # initialize beat plot
         self.__ax_onset.set_ylim(-.1, 1.)
-        self.__yonset = data_on_graph * [0.0]
-        self.__line_onset, = self.__ax_onset.plot(self.__yonset, 'r-')
+        self.__line_onset, = self.__ax_onset.plot(self.__yonset.view(), 'r-')
+
+        artists = self.__lines_sensor + [self.__line_onset]
+        self.__stats_text = None
+        if show_stats:
+            self.__stats_text = self.__fig.text(0.99, 0.99, '', va='top', ha='right', fontsize='x-small')
+            artists.append(self.__stats_text)
+
+        # only the lines (and texts) are redrawn on every frame
+        self.__renderer = BlitRenderer(self.__fig, artists, fps, show_fps)
+
+    @property
+    def clock(self):
+        """The playback clock (AudioClock) of the get_down() sessions."""
+        return self.__clock
+
+    @property
+    def sensor_latency(self):
+        """Delay (s) between a pop and the arrival of its reading, subtracted from the sensor log."""
+        return self.__sensor_latency
+
+    @property
+    def n_dancers(self):
+        """How many sensors (dancers) are read."""
+        return self.__n_dancers
+
+    @property
+    def pop_detectors(self):
+        """The streaming detectors (PopDetector) of the pops of the sessions, one per dancer."""
+        return list(self.__pop_detectors)
+
+    @property
+    def dropped(self):
+        """How many readings of each dancer were dropped because the acquisition queue was full."""
+        return self.__acquisition.dropped
+
+    @property
+    def xruns(self):
+        """How many stream callbacks of the last session reported each kind of buffer under/overflow."""
+        return dict(self.__xruns)
+
+    @property
+    def beat_grid(self):
+        """The beat grid (BeatGrid) of the track, None until get_beat_grid() is called."""
+        return self.__beat_grid
+
+    @property
+    def timers(self):
+        """The per-stage latency histograms (StageTimer) of the sessions."""
+        return self.__timers
+
+    def __count_xruns(self, status):
+        if status:
+            for name, flag in XRUN_FLAGS.items():
+                if status & flag:
+                    self.__xruns[name] += 1
 
     def __callback(self, in_data, frame_count, time_info, status):
-        """Internal method for audio stream callback."""
+        """Internal method for audio stream callback, which only slices the (prefetched) memory-mapped PCM."""
+
+        t = self.__timers.now()
+        self.__count_xruns(status)
+        start = self.__play_pos
+        self.__clock.stamp(start // self.__bytes_per_frame, time_info)
+        self.__play_pos = start + frame_count * self.__bytes_per_frame
+        data = self.__pcm[start:self.__play_pos]
+        self.__timers.lap('audio_callback', t)
+        # a short last buffer is padded with silence
+        return (data, paContinue if len(data) == frame_count * self.__bytes_per_frame else paComplete)
+
+    def get_audio_waveform(self, channel='right', analysis_sr=None):
+        """Class method for getting the audio (mono) waveform.
 
-        data = self.__wf.readframes(frame_count)
-        return (data, pyaudio.paContinue)
+        The data chunk of the file is memory-mapped, so a single channel at the file's rate
+        is a strided view into the file rather than a copy of it. A mix or a lower analysis
+        rate goes through the front end of track_analysis.analysis_waveform() (float32).
 
-    def get_audio_waveform(self, channel='right'):
-        """Class method for getting the audio (mono) waveform.
+        Args:
+            channel (str): Either 'left', 'right' or 'mix' (all channels), from which channel to get the audio waveform
+            analysis_sr (int): Rate at which the onsets are analyzed, e.g. 22050 for about half the work;
+                None for the file's rate. The onset envelope keeps a frame per hop_length samples of the file.
+        """
+
+        # 2D (frames x channels) view of the audio
+        self.__audio = self.__mapped_wave.frames
+        self.__channel = channel
+        self.__analysis_sr = analysis_sr
+        # select (or mix down) the channels and resample for analysis
+        self.__audio_waveform = analysis_waveform(self.__mapped_wave, channel, analysis_sr, self.__hop_length).waveform
+
+    def get_onset_envelope(self, cache=None, segment_frames=None, workers=None):
+        """Class method for getting the onset envelope of the audio file.
 
         Args:
-            channel (str): Either 'left' or 'right', from which channel to get the audio waveform
+            cache (OnsetCache): If given, the envelope is looked up in (and stored to) this on-disk cache.
+                On a hit the librosa pass is skipped, and get_audio_waveform() needn't be called beforehand.
+                A batch_analyze.TrackIndex can be given instead, to look the envelope up in a pre-analyzed library.
+            segment_frames (int): If given, the spectrogram is computed in segments of this many frames on
+                a thread pool, which bounds the memory for long tracks, with the same result
+            workers (int): How many threads compute the segments
         """
 
-        bytes_per_sample = self.__wf.getsampwidth()
-        bits_per_sample = 8 * bytes_per_sample
-        dtype = 'int{0}'.format(bits_per_sample)
-
-        channels = self.__wf.getnchannels()     # number of channels
-        samples = self.__wf.getnframes()        # total samples in the track
-        duration = samples / float(self.__fs)   # duration of the track
-
-        self.__audio = np.fromstring(
-            self.__wf.readframes(int(duration * self.__fs * bytes_per_sample / channels)),
-            dtype=dtype)
-        # reshape the audio array into 2D
-        self.__audio.shape = (self.__audio.shape[0] // channels, channels)
-        if channel == 'left':
-            ch = 0
-        else:
-            ch = 1
-        # select only one channel for analysis
-        self.__audio_waveform = self.__audio[:, ch]
+        self.__onset_env = None
+        self.__beat_grid = None
+        self.__track_beats = None
+        # the hop and the window at the analysis rate, a frame still spans hop_length samples of the file
+        sr, hop_length, n_fft = analysis_rate(self.__fs, self.__hop_length, analysis_sr=self.__analysis_sr)
+        if cache is not None:
+            key = cache.key(self.__audio_filename, sr, hop_length, self.__channel, np.mean)
+            self.__onset_env = cache.get(key)
+            if self.__onset_env is not None:
+                # a pre-analyzed library has the beats as well, which spares get_beat_grid() the beat tracking
+                self.__track_beats = cache.get_beats(key)
+
+        if self.__onset_env is None:
+            if segment_frames is None:
+                self.__onset_env = onset_envelope(self.__audio_waveform, sr, hop_length, n_fft)
+            else:
+                self.__onset_env = segmented_onset_envelope(self.__audio_waveform, sr, hop_length, n_fft,
+                                                            segment_frames=segment_frames, workers=workers)
+            if cache is not None:
+                cache.put(key, self.__onset_env)
+
+    def get_beat_grid(self, beats_per_bar=4):
+        """Class method for analyzing the beats of the audio file, after get_onset_envelope().
+
+        The tempo, the beats, the downbeats and the onset peaks are computed once, see
+        beat_grid.BeatGrid for the lookups into them. The tempo and the beats are taken
+        from the batch_analyze.TrackIndex the envelope came from, if it did.
 
-    def get_onset_envelope(self):
-        """Class method for getting the onset envelope of the audio file."""
+        Args:
+            beats_per_bar (int): How many beats there are to a bar
 
-        self.__onset_env = rosa.onset.onset_strength(
-            self.__audio_waveform.astype(np.float),
-            sr=self.__fs,
-            aggregate=np.mean)
+        Returns:
+            BeatGrid: The beat grid of the track
+        """
 
-        # normalize the onset envelope
-        self.__onset_env /= np.max(self.__onset_env)
-        # convert onset array to list
-        self.__onset_env_list = self.__onset_env.tolist()
+        if self.__track_beats is not None:
+            tempo, beats = self.__track_beats
+            self.__beat_grid = BeatGrid.from_beats(tempo, beats, self.__onset_env, self.__fs, self.__hop_length,
+                                                   beats_per_bar)
+        else:
+            self.__beat_grid = BeatGrid.from_onset_envelope(self.__onset_env, self.__fs, self.__hop_length,
+                                                            beats_per_bar)
+        return self.__beat_grid
 
     def __rewind_audio(self):
         """Rewind the audio stream (shift cursor to the beginning of the file)."""
-        self.__wf.rewind()
-        return int(self.__wf.tell() / self.__hop_length)
+        self.__play_pos = 0
+        return 0
 
-    def get_down(self):
-        """Start playing the audio stream and plot the onset envelope, as well as display the serial input."""
+    def __audible_frame(self):
+        """Index of the onset frame being heard right now, according to the audio clock."""
+
+        frame = int(self.__clock.audio_time() * self.__fs / self.__hop_length)
+        return min(max(frame, 0), len(self.__onset_env))
+
+    def get_down(self, stats_path=None, frames_per_buffer=1024, record_path=None):
+        """Start playing the audio stream and plot the onset envelope, as well as display the serial input.
+
+        Args:
+            stats_path (str): If given, the per-stage latencies of the session are written to this .csv or .json file
+            frames_per_buffer (int): Buffer size of the audio stream, smaller buffers mean lower latency
+                but less headroom against glitches (see xruns)
+            record_path (str): If given, the session is recorded to this directory, see session_recorder
+        """
 
         cur_frame = self.__rewind_audio()
-        self.__fig.show()
+        # the callback reads straight from memory, so get the whole file in before playing
+        self.__mapped_wave.prefetch()
+        self.__pcm = memoryview(self.__mapped_wave.raw)
+        if self.__rendered:
+            self.__fig.show()
         self.__stream = self.__p.open(
-            format=self.__p.get_format_from_width(self.__wf.getsampwidth()),
-            channels=self.__wf.getnchannels(),
-            rate=self.__wf.getframerate(),
+            format=self.__p.get_format_from_width(self.__mapped_wave.getsampwidth()),
+            channels=self.__mapped_wave.getnchannels(),
+            rate=self.__fs,
             output=True,
+            frames_per_buffer=frames_per_buffer,
             stream_callback=self.__callback)
+        self.__start_session(self.__clock, record_path)
+        self.__clock.reset(self.__start_time, self.__stream.get_output_latency())
         self.__stream.start_stream()
 
-        while self.__stream.is_active():
-            # update onset graph
-            prev_frame = cur_frame
-            cur_frame = int(self.__wf.tell() / self.__hop_length)
-            self.__yonset = self.__yonset[cur_frame-prev_frame : ] + self.__onset_env_list[prev_frame : cur_frame]
-            self.__line_onset.set_ydata(self.__yonset)
+        try:
+            while self.__stream.is_active():
+                loop_start = t = self.__timers.now()
+                # update onset graph up to what's audible, rather than up to what's been read from the file
+                prev_frame = cur_frame
+                cur_frame = max(prev_frame, self.__audible_frame())
+                self.__yonset.extend(self.__onset_env[prev_frame : cur_frame])
+                if self.__rendered:
+                    self.__line_onset.set_ydata(self.__yonset.view())
+                t = self.__timers.lap('onset', t)
+
+                # update sensor data graph
+                self.__update_sensor_graph(cur_frame - prev_frame, prev_frame)
+                self.__timers.lap('sensor', t)
+
+                self.__render(loop_start)
+        finally:
+            # also when the session is cut short (Ctrl-C), so the readings and the recording are kept
+            self.__stream.stop_stream()
+            self.__stop_session(stats_path)
+
+    def __start_session(self, clock=None, record_path=None):
+        """Start the sensor acquisition and the log of its readings, right as the audio starts.
 
-            # update sensor data graph
-            sensor_data = self.__ser.readline()
-            data_string = sensor_data.strip().decode('UTF-8')
-            data_array = data_string.split(' ')
+        Args:
+            clock (AudioClock): The clock to timestamp the readings with, None for the time since the start
+            record_path (str): Directory to record the session to, None not to record it
+        """
 
-            force = 0
-            if data_array[0].isdigit():
-                force = int(data_array[0])
-            self.__ysensor = self.__ysensor[cur_frame - prev_frame:] + (cur_frame - prev_frame) * [force]
-            self.__line_sensor.set_ydata(self.__ysensor)
+        self.__start_time = self.__now()
+        self.__session_clock = clock
+        self.__recorder = None
+        if record_path is not None:
+            self.__recorder = SessionRecorder(record_path, meta={
+                'mode': 'listen' if clock is None else 'get_down',
+                'audio_filename': self.__audio_filename,
+                'sr': self.__fs,
+                'hop_length': self.__hop_length,
+                'output_latency': self.__clock.latency,
+                'sensor_latency': self.__sensor_latency,
+            })
+        self.__xruns = dict.fromkeys(XRUN_FLAGS, 0)
+        self.__timers.reset()
+        self.__timestamp_logs = [[] for _ in range(self.__n_dancers)]
+        self.__force_logs = [[] for _ in range(self.__n_dancers)]
+        self.__pop_logs = [[] for _ in range(self.__n_dancers)]
+        for pop_detector in self.__pop_detectors:
+            pop_detector.reset()
+        self.__acquisition.start()
+
+    def __stop_session(self, stats_path=None):
+        """Stop the sensor acquisition, log the readings which haven't been drained yet and dump the latencies."""
+
+        self.__acquisition.stop()
+        for i in range(self.__n_dancers):
+            self.__log_forces(i, *self.__acquisition.drain(i))
+        if self.__recorder is not None:
+            self.__recorder.close()
+            self.__recorder = None
+        if stats_path is not None:
+            self.__timers.dump(stats_path)
+
+    def __render(self, loop_start):
+        """Wait for the next frame and render it, timing the rendering and the whole loop."""
+
+        if self.__rendered:
+            self.__renderer.wait()
+            t = self.__timers.now()
+            if self.__renderer.draw() and self.__stats_text is not None:
+                # the percentiles needn't be fresher than a few times a second
+                if self.__timers.histogram('render').count % 30 == 0:
+                    self.__stats_text.set_text(self.__timers.summary_text())
+            self.__timers.lap('render', t)
+        if self.__recorder is not None:
+            now = self.__now()
+            self.__recorder.append_row('frames', now, self.__session_time(now))
+        self.__timers.lap('loop', loop_start)
+
+    def __session_time(self, t):
+        """Map monotonic time(s) onto the session clock."""
+
+        if self.__session_clock is None:
+            return t - self.__start_time
+        return self.__session_clock.audio_time(t)
+
+    def __log_forces(self, dancer, timestamps, forces):
+        """Keep the readings of a dancer, with their timestamps on the session clock.
+
+        Returns:
+            np.ndarray: The session clock timestamps (s)
+        """
+
+        audio_times = self.__session_time(timestamps)
+        pops = self.__pop_detectors[dancer].process(audio_times, forces)
+        self.__timestamp_logs[dancer].append(audio_times)
+        self.__force_logs[dancer].append(forces)
+        self.__pop_logs[dancer].append(pops)
+        if self.__recorder is not None:
+            self.__recorder.append('sensor', audio_times, forces, np.full(len(forces), dancer))
+            self.__recorder.append('pops', pops, np.full(len(pops), dancer))
+        return audio_times
 
-            self.__fig.canvas.draw()
-            self.__fig.canvas.flush_events()
+    def __update_sensor_graph(self, n_frames, first_frame=None):
+        """Advance the sensor graph of every dancer by n_frames (onset) frames, showing the peak force
+        of the readings that belong to each of them.
+
+        Args:
+            n_frames (int): By how many frames the onset graph advanced
+            first_frame (int): Index of the first of these onset frames, to place the readings by their
+                audio clock timestamps. None to split the readings evenly over the frames instead.
+        """
+
+        if n_frames <= 0:
+            # keep the readings queued until the graph moves on
+            return
+        for i in range(self.__n_dancers):
+            self.__update_sensor_line(i, n_frames, first_frame)
+
+    def __update_sensor_line(self, dancer, n_frames, first_frame):
+        """Advance the sensor graph of one dancer, see __update_sensor_graph()."""
+
+        timestamps, forces = self.__acquisition.drain(dancer)
+        audio_times = self.__log_forces(dancer, timestamps, forces)
+        ysensor = self.__ysensors[dancer]
+        if len(forces) == 0:
+            # nothing arrived, hold the last reading
+            ysensor.fill(self.__forces[dancer], n_frames)
+        elif first_frame is None:
+            # split the readings evenly over the frames, keeping the peak of each share
+            bounds = (np.arange(n_frames) * len(forces)) // n_frames
+            ysensor.extend(np.maximum.reduceat(forces, bounds))
+            self.__forces[dancer] = forces[-1]
+        else:
+            # the onset frame of each pop, late readings go to the newest frame
+            frames = ((audio_times - self.__sensor_latency) * self.__fs / self.__hop_length).astype(np.int64)
+            frames = np.clip(frames - first_frame, 0, n_frames - 1)
+            peaks = np.full(n_frames, -1, dtype=np.int64)
+            np.maximum.at(peaks, frames, forces)
+            # frames without readings hold the previous one
+            has_reading = peaks >= 0
+            held = np.maximum.accumulate(np.where(has_reading, np.arange(n_frames), -1))
+            peaks = np.where(held >= 0, peaks[np.maximum(held, 0)], self.__forces[dancer])
+            ysensor.extend(peaks)
+            self.__forces[dancer] = forces[-1]
+        if self.__rendered:
+            self.__lines_sensor[dancer].set_ydata(ysensor.view())
+
+    def __listen_callback(self, in_data, frame_count, time_info, status):
+        """Internal method for input stream callback, feeding the streaming onset detector."""
+
+        t = self.__timers.now()
+        self.__count_xruns(status)
+        block = np.frombuffer(in_data, dtype=np.int16).reshape(frame_count, self.__live_channels)
+        self.__live_frames.append(self.__onset_stream.process(block[:, self.__live_ch]))
+        self.__timers.lap('audio_callback', t)
+        return (None, paContinue)
+
+    def listen(self, rate=44100, channels=1, channel='right', input_device_index=None, stats_path=None,
+               record_path=None):
+        """Record live audio input (microphone or line-in) and plot its onset envelope as it arrives,
+        as well as display the serial input. Unlike get_down(), no onset envelope is needed up front.
+
+        Args:
+            rate (int): Sampling rate of the audio input
+            channels (int): Number of channels of the audio input
+            channel (str): Either 'left' or 'right', from which channel of a stereo input to detect the onsets
+            input_device_index (int): Which input device to record from, None for the default one
+            stats_path (str): If given, the per-stage latencies of the session are written to this .csv or .json file
+            record_path (str): If given, the session is recorded to this directory, see session_recorder
+        """
+
+        self.__live_channels = channels
+        self.__live_ch = 0 if channel == 'left' or channels == 1 else 1
+        self.__onset_stream = StreamingOnsetStrength(rate, hop_length=self.__hop_length)
+        # onset frames handed over from the callback thread
+        self.__live_frames = deque()
+        max_onset = 0.
+
+        self.__fig.show()
+        self.__stream = self.__p.open(
+            format=paInt16,
+            channels=channels,
+            rate=rate,
+            input=True,
+            input_device_index=input_device_index,
+            frames_per_buffer=self.__chunk,
+            stream_callback=self.__listen_callback)
+        self.__stream.start_stream()
+        self.__start_session(record_path=record_path)
+
+        try:
+            while self.__stream.is_active():
+                loop_start = t = self.__timers.now()
+                # update onset graph, normalized by the strongest onset so far
+                n_new = 0
+                while self.__live_frames:
+                    new_frames = self.__live_frames.popleft()
+                    if len(new_frames) == 0:
+                        continue
+                    max_onset = max(max_onset, np.max(new_frames))
+                    if max_onset > 0:
+                        new_frames = new_frames / max_onset
+                    self.__yonset.extend(new_frames)
+                    n_new += len(new_frames)
+                self.__line_onset.set_ydata(self.__yonset.view())
+                t = self.__timers.lap('onset', t)
+
+                # update sensor data graph
+                self.__update_sensor_graph(n_new)
+                self.__timers.lap('sensor', t)
+
+                self.__render(loop_start)
+        finally:
+            # also when the session is cut short (Ctrl-C), so the readings and the recording are kept
+            self.__stream.stop_stream()
+            self.__stop_session(stats_path)
+
+    def get_sensor_log(self, dancer=0):
+        """Class method for getting the sensor readings of the last session.
+
+        Args:
+            dancer (int): Whose readings, the index of their serial port
+
+        Returns:
+            (np.ndarray, np.ndarray): The timestamps (s, position in the audio heard at the time of the pop,
+                i.e. compensated for the output and sensor latencies) and the force readings
+        """
+
+        timestamps = np.concatenate(self.__timestamp_logs[dancer]) - self.__sensor_latency
+        return timestamps, np.concatenate(self.__force_logs[dancer])
+
+    def get_pops(self, dancer=0):
+        """Class method for getting the pops detected during the last session, as they happened.
+
+        Args:
+            dancer (int): Whose pops, the index of their serial port
+
+        Returns:
+            np.ndarray: The start times of the pops (s, on the same clock as get_sensor_log())
+        """
+
+        return np.concatenate(self.__pop_logs[dancer]) - self.__sensor_latency
+
+    def calibrate(self, dancer=0):
+        """Class method for estimating the sensor latency from the last get_down() session, in which
+        the pops were made right on the beat (e.g. tapping to a metronome track). The estimate is
+        used from then on, in the sensor graph, get_sensor_log(), get_pops() and score_pops().
+
+        Args:
+            dancer (int): Whose session to calibrate with, the sensors are assumed to be alike
+
+        Returns:
+            float: The sensor latency (s), positive when the readings arrive after the beat is heard
+        """
+
+        # the pops as detected, before the current estimate was taken off
+        pop_times = self.get_pops(dancer) + self.__sensor_latency
+        if self.__beat_grid is None:
+            self.get_beat_grid()
+        self.__sensor_latency = estimate_offset(pop_times, self.__beat_grid.beats)
+        return self.__sensor_latency
+
+    def score_pops(self, tolerance=0.07, dancer=0):
+        """Class method for scoring how well the pops of the last get_down() session hit the beats of the track.
+
+        Args:
+            tolerance (float): How far (s) from the nearest beat a pop still counts as a hit
+            dancer (int): Whose pops to score, the index of their serial port
+
+        Returns:
+            AlignmentScore: The per-pop offsets and the summary statistics, see pop_align
+        """
 
+        if self.__beat_grid is None:
+            self.get_beat_grid()
+        return score_alignment(self.get_pops(dancer), self.__beat_grid.beats, tolerance)
@@ -1,4 +1,5 @@
 from dance2music import Dance2Music
+from onset_cache import OnsetCache
 
 serial_port = 'COM3'
 baud_rate = 19200
@@ -6,7 +7,9 @@ filename = 'F:/My Documents/pop_harder/test_audio/West_Bubbles.wav'
 west_bubble_pop = Dance2Music(serial_port, baud_rate, filename)
 
 west_bubble_pop.get_audio_waveform()
-west_bubble_pop.get_onset_envelope()
+west_bubble_pop.get_onset_envelope(OnsetCache())
 
 if __name__ == '__main__':
-    west_bubble_pop.get_down()
\ No newline at end of file
+    west_bubble_pop.get_down()
+    score = west_bubble_pop.score_pops()
+    print('hit rate: {0:.0%}, mean offset: {1:.0f} ms'.format(score.hit_rate, 1000 * score.mean_abs_offset))
@@ -0,0 +1,202 @@
+import csv
+import json
+import time
+import numpy as np
+from array import array
+
+class LatencyHistogram:
+    """An HDR-style histogram of latencies in nanoseconds.
+
+    Values below 2**sub_bits ns get a bucket each; above, every power of two is split
+    into 2**(sub_bits - 1) buckets, so the relative error stays below 2**(1 - sub_bits)
+    over the whole range. The counts live in one preallocated array.array, recording a
+    value is a few integer operations and no allocation.
+    """
+
+    def __init__(self, max_ns=60 * 10**9, sub_bits=7):
+        """Preallocate the buckets.
+
+        Args:
+            max_ns (int): Largest latency (in ns) to be told apart, larger ones go to the last bucket
+            sub_bits (int): Precision of the buckets, see the class docstring
+        """
+
+        self.__sub_bits = sub_bits
+        self.__half = 1 << (sub_bits - 1)
+        self.__n_buckets = self.__index(max_ns) + 1
+        # a typed array is much cheaper to increment than a NumPy one, and viewed by NumPy for free
+        self.__counts = array('q', bytes(8 * self.__n_buckets))
+        self.__count = 0
+        self.__total = 0
+        self.__max = 0
+
+    def __index(self, value):
+        shift = value.bit_length() - self.__sub_bits
+        if shift <= 0:
+            return value
+        return shift * self.__half + (value >> shift)
+
+    def __lower_bound(self, index):
+        """Smallest value (ns) falling into a bucket."""
+
+        if index < 2 * self.__half:
+            return index
+        shift = index // self.__half - 1
+        return (index - shift * self.__half) << shift
+
+    def record(self, value):
+        """Record one latency.
+
+        Args:
+            value (int): The latency (ns)
+        """
+
+        self.__counts[min(self.__index(value), self.__n_buckets - 1)] += 1
+        self.__count += 1
+        self.__total += value
+        if value > self.__max:
+            self.__max = value
+
+    @property
+    def count(self):
+        return self.__count
+
+    @property
+    def mean(self):
+        """Mean latency (ns)."""
+        return self.__total / self.__count if self.__count else 0.
+
+    @property
+    def max(self):
+        """Largest latency (ns)."""
+        return self.__max
+
+    def percentile(self, q):
+        """Latency (ns) below which q percent of the recorded ones fall, to the bucket precision.
+
+        Args:
+            q (float): The percentile, 0 - 100
+        """
+
+        if self.__count == 0:
+            return 0
+        rank = max(1, int(np.ceil(q / 100. * self.__count)))
+        index = int(np.searchsorted(np.cumsum(np.frombuffer(self.__counts, dtype=np.int64)), rank))
+        return min(self.__lower_bound(index), self.__max)
+
+    def buckets(self):
+        """The non-empty buckets, as (lower bounds in ns, counts) arrays."""
+
+        counts = np.frombuffer(self.__counts, dtype=np.int64)
+        indices = np.flatnonzero(counts)
+        return np.array([self.__lower_bound(i) for i in indices], dtype=np.int64), counts[indices]
+
+    def reset(self):
+        np.frombuffer(self.__counts, dtype=np.int64)[:] = 0
+        self.__count = 0
+        self.__total = 0
+        self.__max = 0
+
+class StageTimer:
+    """Per-stage latency instrumentation for the session loops, cheap enough to be always on.
+
+    A stage is timed by taking now() before it and calling lap() after it, which records
+    the elapsed time.perf_counter_ns() into the stage's LatencyHistogram and returns the
+    new timestamp, so consecutive stages can be chained:
+
+        t = timers.now()
+        read_sensor()
+        t = timers.lap('sensor', t)
+        draw()
+        timers.lap('render', t)
+    """
+
+    PERCENTILES = (50, 90, 99, 99.9)
+
+    def __init__(self, stages=()):
+        """Initialize the histograms.
+
+        Args:
+            stages (tuple): Names of the stages known up front, others are added when first timed
+        """
+
+        self.__histograms = {}
+        for stage in stages:
+            self.__histograms[stage] = LatencyHistogram()
+
+    @staticmethod
+    def now():
+        """Current timestamp (ns) to time a stage from."""
+        return time.perf_counter_ns()
+
+    def lap(self, stage, start):
+        """Record the time elapsed since start as one run of a stage.
+
+        Args:
+            stage (str): Name of the stage
+            start (int): Timestamp (ns) the stage began at, from now() or the previous lap()
+
+        Returns:
+            int: The current timestamp (ns), for the next stage
+        """
+
+        end = time.perf_counter_ns()
+        histogram = self.__histograms.get(stage)
+        if histogram is None:
+            histogram = self.__histograms[stage] = LatencyHistogram()
+        histogram.record(end - start)
+        return end
+
+    def histogram(self, stage):
+        return self.__histograms[stage]
+
+    def stages(self):
+        return list(self.__histograms)
+
+    def reset(self):
+        for histogram in self.__histograms.values():
+            histogram.reset()
+
+    def summary(self):
+        """Summary of every stage as a dict of dicts (times in ms)."""
+
+        summary = {}
+        for stage, histogram in self.__histograms.items():
+            stats = {'count': histogram.count, 'mean_ms': histogram.mean / 1e6, 'max_ms': histogram.max / 1e6}
+            for q in self.PERCENTILES:
+                stats['p{0:g}_ms'.format(q)] = histogram.percentile(q) / 1e6
+            summary[stage] = stats
+        return summary
+
+    def summary_text(self):
+        """One line per stage with its p50/p99, e.g. for a live overlay on the plot."""
+
+        lines = []
+        for stage, histogram in self.__histograms.items():
+            lines.append('{0}: p50 {1:.2f} / p99 {2:.2f} ms'.format(
+                stage, histogram.percentile(50) / 1e6, histogram.percentile(99) / 1e6))
+        return '\n'.join(lines)
+
+    def dump(self, path):
+        """Write the summary and the histogram buckets of every stage to a file.
+
+        Args:
+            path (str): A .json file gets summary and buckets; any other file gets the summary as CSV
+        """
+
+        summary = self.summary()
+        if path.endswith('.json'):
+            for stage in summary:
+                lower_bounds, counts = self.__histograms[stage].buckets()
+                summary[stage]['buckets_ns'] = lower_bounds.tolist()
+                summary[stage]['counts'] = counts.tolist()
+            with open(path, 'w') as f:
+                json.dump(summary, f, indent=2)
+            return
+
+        fields = ['stage', 'count', 'mean_ms', 'max_ms'] + ['p{0:g}_ms'.format(q) for q in self.PERCENTILES]
+        with open(path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            for stage, stats in summary.items():
+                writer.writerow(dict(stats, stage=stage))
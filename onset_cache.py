@@ -0,0 +1,119 @@
+import os
+import hashlib
+import numpy as np
+
+class OnsetCache:
+    """An on-disk cache of normalized onset envelopes, so that a track which has
+    already been analyzed doesn't need another librosa pass.
+
+    Entries are keyed by the content hash of the audio file plus the analysis
+    parameters, stored as .npy files and loaded memory-mapped. The least recently
+    used entries are evicted once the cache grows over its size budget.
+    """
+
+    def __init__(self, cache_dir='.onset_cache', max_bytes=256 * 1024 * 1024):
+        """Initialize the cache directory.
+
+        Args:
+            cache_dir (str): In which directory the envelopes are stored
+            max_bytes (int): Total size of the cache (in bytes) before old entries are evicted
+        """
+
+        self.__cache_dir = cache_dir
+        self.__max_bytes = max_bytes
+        os.makedirs(self.__cache_dir, exist_ok=True)
+
+    @staticmethod
+    def hash_file(filename, block_size=1024 * 1024):
+        """Get the SHA-1 digest of the file content.
+
+        Args:
+            filename (str): Which file to hash
+            block_size (int): How many bytes are read at a time
+        """
+
+        sha1 = hashlib.sha1()
+        with open(filename, 'rb') as f:
+            for block in iter(lambda: f.read(block_size), b''):
+                sha1.update(block)
+        return sha1.hexdigest()
+
+    def key(self, audio_filename, sr, hop_length, channel, aggregate=np.mean):
+        """Get the cache key of an onset envelope.
+
+        Args:
+            audio_filename (str): From which file the audio is read
+            sr (int): Sampling rate of the analysis
+            hop_length (int): By how many samples the frame is shifted
+            channel (str): From which channel the audio waveform is taken
+            aggregate (callable): How the onset strength is aggregated across frequency bins
+        """
+
+        aggregate_name = getattr(aggregate, '__name__', str(aggregate))
+        params = '{0}_{1}_{2}_{3}'.format(sr, hop_length, channel, aggregate_name)
+        return '{0}_{1}'.format(self.hash_file(audio_filename), params)
+
+    def __path(self, key):
+        return os.path.join(self.__cache_dir, key + '.npy')
+
+    def get(self, key):
+        """Get the cached onset envelope as a read-only memory-mapped array, or None on a miss.
+
+        Args:
+            key (str): The cache key, see key()
+        """
+
+        path = self.__path(key)
+        try:
+            onset_env = np.load(path, mmap_mode='r')
+        except (IOError, ValueError):
+            return None
+
+        # refresh the modification time, which serves as the LRU stamp
+        os.utime(path, None)
+        return onset_env
+
+    def get_beats(self, key):
+        """Get the tempo and the beats analyzed with the envelope, always None: only envelopes are cached.
+
+        Args:
+            key (str): The cache key, see key()
+        """
+
+        return None
+
+    def put(self, key, onset_env):
+        """Store an onset envelope and evict the least recently used entries if over budget.
+
+        Args:
+            key (str): The cache key, see key()
+            onset_env (np.ndarray): The normalized onset envelope
+        """
+
+        path = self.__path(key)
+        # write to a temporary file first so that a reader never sees a partial entry
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.save(f, np.ascontiguousarray(onset_env))
+        os.replace(tmp_path, path)
+        self.__evict(keep=path)
+
+    def __evict(self, keep=None):
+        """Remove the least recently used entries until the cache fits in max_bytes."""
+
+        entries = []
+        for name in os.listdir(self.__cache_dir):
+            if not name.endswith('.npy'):
+                continue
+            path = os.path.join(self.__cache_dir, name)
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.__max_bytes:
+                break
+            if path == keep:
+                continue
+            os.remove(path)
+            total -= size
@@ -0,0 +1,104 @@
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+
+class StreamingOnsetStrength:
+    """An incremental version of rosa.onset.onset_strength for live or unbounded audio.
+
+    Audio is fed block by block (e.g. as it arrives from a pyaudio stream), and an
+    onset strength value is emitted for every hop that becomes complete. The STFT
+    tail and the previous mel frame are kept between blocks, so the cost of a block
+    only depends on its length.
+
+    The output follows the offline one frame for frame (including the leading zero
+    frames librosa pads with). The only difference is the top_db floor of the dB
+    conversion, which offline is relative to the maximum of the whole track and here
+    to the maximum seen so far unless max_db is given.
+    """
+
+    def __init__(self, sr, hop_length=512, n_fft=2048, n_mels=128, top_db=80.0, max_db=None, aggregate=np.mean):
+        """Initialize the mel filterbank and the streaming state.
+
+        Args:
+            sr (int): Sampling rate of the incoming audio
+            hop_length (int): By how many samples the frame is shifted
+            n_fft (int): Length of the FFT window (in # of samples)
+            n_mels (int): Number of mel bands
+            top_db (float): Threshold (in dB) below the loudest frame seen so far at which the spectrum is floored
+            max_db (float): Initial loudest mel power (in dB), e.g. known from an earlier analysis of the same
+                track. With it the output matches the offline onset strength exactly.
+            aggregate (callable): How the onset strength is aggregated across mel bands
+        """
+
+        import librosa as rosa
+
+        self.__hop_length = hop_length
+        self.__n_fft = n_fft
+        self.__top_db = top_db
+        self.__initial_max_db = -np.inf if max_db is None else max_db
+        self.__aggregate = aggregate
+
+        self.__window = rosa.filters.get_window('hann', n_fft, fftbins=True)
+        self.__mel_basis = rosa.filters.mel(sr=sr, n_fft=n_fft, n_mels=n_mels, fmax=sr / 2.0)
+        self.reset()
+
+    def reset(self):
+        """Reset the state, as if no audio had been fed yet."""
+
+        # the offline STFT is centered, i.e. the signal is padded with n_fft // 2 zeros at the front
+        self.__buffer = np.zeros(self.__n_fft // 2)
+        self.__prev_mel_db = None
+        self.__max_db = self.__initial_max_db
+        self.__started = False
+
+    def process(self, block):
+        """Feed a block of audio and get the onset strength frames it completes.
+
+        Args:
+            block (np.ndarray): 1D block of mono audio samples (of any length)
+
+        Returns:
+            np.ndarray: The new onset strength frames, possibly empty
+        """
+
+        self.__buffer = np.concatenate((self.__buffer, np.asarray(block, dtype=np.float64)))
+        n_frames = 1 + (len(self.__buffer) - self.__n_fft) // self.__hop_length
+        if n_frames < 1:
+            return np.zeros(0)
+
+        # view the complete frames in place and keep the unconsumed tail for the next block
+        frames = as_strided(self.__buffer,
+                            shape=(n_frames, self.__n_fft),
+                            strides=(self.__hop_length * self.__buffer.strides[0], self.__buffer.strides[0]))
+        power = np.abs(np.fft.rfft(frames * self.__window, axis=1)) ** 2
+        self.__buffer = self.__buffer[n_frames * self.__hop_length:]
+
+        return self.__onset_frames(power.dot(self.__mel_basis.T))
+
+    def flush(self):
+        """Pad the stream with n_fft // 2 zeros, the same way the offline STFT pads the end of a track.
+
+        Returns:
+            np.ndarray: The last onset strength frames
+        """
+
+        return self.process(np.zeros(self.__n_fft // 2))
+
+    def __onset_frames(self, mel):
+        """Turn mel power frames (frames x bands) into onset strength frames."""
+
+        mel_db = 10.0 * np.log10(np.maximum(1e-10, mel))
+        self.__max_db = max(self.__max_db, mel_db.max())
+
+        if self.__prev_mel_db is not None:
+            mel_db = np.vstack((self.__prev_mel_db, mel_db))
+        # keep the previous frame unfloored, so it's floored against the current maximum
+        self.__prev_mel_db = mel_db[-1:].copy()
+        np.maximum(mel_db, self.__max_db - self.__top_db, out=mel_db)
+
+        onset_env = self.__aggregate(np.maximum(0.0, mel_db[1:] - mel_db[:-1]), axis=1)
+
+        if not self.__started:
+            # compensate for the lag and the centering, as the offline version does
+            self.__started = True
+            onset_env = np.concatenate((np.zeros(1 + self.__n_fft // (2 * self.__hop_length)), onset_env))
+        return onset_env
@@ -0,0 +1,53 @@
+import numpy as np
+import librosa as rosa
+from wav_mmap import MappedWave
+from onset_stream import StreamingOnsetStrength
+
+filename = 'West_Bubbles.wav'
+hop_length = 512
+block = 1024                # samples per block, as delivered by the audio stream
+seconds = 15.0
+
+mapped_wave = MappedWave(filename)
+fs = mapped_wave.getframerate()
+audio_mono = mapped_wave.channel(1)[:int(seconds * fs)].astype(np.float64)
+
+def track_max_db():
+    """The loudest mel power (in dB) of the track, which the offline top_db floor is relative to."""
+    return np.max(rosa.power_to_db(rosa.feature.melspectrogram(y=audio_mono, sr=fs, hop_length=hop_length)))
+
+def offline_envelope():
+    return rosa.onset.onset_strength(y=audio_mono, sr=fs, hop_length=hop_length, aggregate=np.mean)
+
+def streaming_envelope(max_db=None):
+    onset_stream = StreamingOnsetStrength(fs, hop_length=hop_length, max_db=max_db)
+    frames = [onset_stream.process(audio_mono[i:i + block]) for i in range(0, len(audio_mono), block)]
+    frames.append(onset_stream.flush())
+    return np.concatenate(frames)
+
+def divergence(onset_env, streamed_env):
+    """Max absolute error and correlation between the normalized envelopes."""
+
+    streamed_env = streamed_env[:len(onset_env)]
+    max_error = np.max(np.abs(onset_env / np.max(onset_env) - streamed_env / np.max(streamed_env)))
+    correlation = np.corrcoef(onset_env, streamed_env)[0, 1]
+    return max_error, correlation
+
+def test_streaming_matches_offline_with_known_max_db():
+    onset_env = offline_envelope()
+    streamed_env = streaming_envelope(max_db=track_max_db())
+
+    assert len(streamed_env) >= len(onset_env)
+    assert np.allclose(streamed_env[:len(onset_env)], onset_env)
+
+def test_streaming_divergence_with_running_max_db():
+    max_error, correlation = divergence(offline_envelope(), streaming_envelope())
+    print('running max_db: max error {0:.4f}, correlation {1:.4f}'.format(max_error, correlation))
+
+    assert correlation > 0.9
+
+if __name__ == '__main__':
+    onset_env = offline_envelope()
+    for max_db in (None, track_max_db()):
+        max_error, correlation = divergence(onset_env, streaming_envelope(max_db))
+        print('max_db={0}: max error {1:.3g}, correlation {2:.6f}'.format(max_db, max_error, correlation))
@@ -0,0 +1,85 @@
+import numpy as np
+from collections import namedtuple
+
+AlignmentScore = namedtuple('AlignmentScore', [
+    'offsets',          # per pop: pop time - nearest beat time (s), negative when early
+    'nearest_beats',    # per pop: index of the nearest beat
+    'relative_errors',  # per pop: offset as a fraction of the local beat period
+    'hits',             # per pop: whether the offset is within the tolerance
+    'hit_rate',         # fraction of pops that hit a beat
+    'mean_abs_offset',  # mean absolute offset (s)
+    'beats_hit',        # fraction of the beats during the pops with at least one pop on them
+])
+
+def beat_times(onset_env, sr, hop_length=512):
+    """Track the beats of an onset envelope.
+
+    Args:
+        onset_env (np.ndarray): The onset envelope
+        sr (int): Sampling rate of the audio
+        hop_length (int): By how many samples the frame is shifted
+
+    Returns:
+        (float, np.ndarray): The tempo (bpm) and the sorted beat times (s)
+    """
+
+    import librosa as rosa
+
+    tempo, beats = rosa.beat.beat_track(onset_envelope=onset_env, sr=sr, hop_length=hop_length, units='time')
+    return float(np.atleast_1d(tempo)[0]), beats
+
+def score_alignment(pop_times, beats, tolerance=0.07):
+    """Match every pop to its nearest beat and score the timing.
+
+    The beats are looked up with a binary search, so scoring is O(pops * log(beats))
+    and cheap enough to be redone every frame of a live session.
+
+    Args:
+        pop_times (np.ndarray): The pop times (s)
+        beats (np.ndarray): The sorted beat times (s), at least two of them
+        tolerance (float): How far (s) from the nearest beat a pop still counts as a hit
+
+    Returns:
+        AlignmentScore: The per-pop offsets and the summary statistics
+    """
+
+    pop_times = np.asarray(pop_times, dtype=np.float64)
+    beats = np.asarray(beats, dtype=np.float64)
+
+    # the nearest beat is either the one right before or right after the pop
+    right = np.clip(np.searchsorted(beats, pop_times), 1, len(beats) - 1)
+    left = right - 1
+    nearest = np.where(pop_times - beats[left] <= beats[right] - pop_times, left, right)
+    offsets = pop_times - beats[nearest]
+
+    # relate the offset to the beat period around the pop
+    periods = beats[right] - beats[left]
+    relative_errors = offsets / periods
+
+    hits = np.abs(offsets) <= tolerance
+    if len(pop_times) == 0:
+        return AlignmentScore(offsets, nearest, relative_errors, hits, 0., 0., 0.)
+
+    # only count the beats during the time the dancer was popping
+    first, last = np.searchsorted(beats, [pop_times.min() - tolerance, pop_times.max() + tolerance])
+    beats_hit = len(np.unique(nearest[hits])) / float(max(1, last - first))
+    return AlignmentScore(offsets, nearest, relative_errors, hits,
+                          float(np.mean(hits)), float(np.mean(np.abs(offsets))), beats_hit)
+
+def estimate_offset(pop_times, beats):
+    """Estimate the systematic sensor-to-audio offset, from pops made on the beat (e.g. to a metronome).
+
+    A dancer is early as often as late, what's left in the median offset to the nearest
+    beat is the latency of the sensor chain relative to the audio output.
+
+    Args:
+        pop_times (np.ndarray): The pop times (s)
+        beats (np.ndarray): The sorted beat times (s), at least two of them
+
+    Returns:
+        float: The median offset (s), positive when the pops are registered late
+    """
+
+    if len(pop_times) == 0:
+        return 0.
+    return float(np.median(score_alignment(pop_times, beats).offsets))
@@ -0,0 +1,118 @@
+import time
+import numpy as np
+
+def _rolling_min(x, width):
+    """Minimum of every window of width consecutive values of x, len(x) - width + 1 of them.
+
+    The van Herk/Gil-Werman algorithm in NumPy: with x cut into blocks of the window's
+    width, every window spans the end of one block and the start of the next, so its
+    minimum is that of a running minimum from either side, O(1) per value whatever the
+    width (and without importing scipy.ndimage, which would dominate the start-up time).
+    """
+
+    n = len(x)
+    blocks = np.concatenate((x, np.full(-n % width, np.inf))).reshape(-1, width)
+    from_start = np.minimum.accumulate(blocks, axis=1).ravel()
+    to_end = np.minimum.accumulate(blocks[:, ::-1], axis=1)[:, ::-1].ravel()
+    return np.minimum(to_end[:n - width + 1], from_start[width - 1:n])
+
+class PopDetector:
+    """An incremental pop detector over the force stream, fed batch by batch as the readings arrive.
+
+    The force is measured against an adaptive baseline, the lowest reading of a window
+    longer than a pop, which follows the resting force of the tattoo as it drifts but
+    isn't pulled up by the pops themselves. A pop starts
+    where the force rises on_threshold above the baseline, and the detector re-arms only
+    once it has fallen back below off_threshold (hysteresis), so a force wobbling around
+    one threshold doesn't count as several pops; neither does a pop starting within the
+    refractory period of the previous one.
+
+    Every step but the refractory check is vectorized over the batch, and the last
+    readings of the window, the hysteresis state and the time of the last pop are carried
+    over to the next batch, so the result doesn't depend on how the stream is split into
+    batches. A stream starting in the middle of a pop doesn't count that pop.
+    """
+
+    def __init__(self, on_threshold=300, off_threshold=150, baseline_window=501, refractory=0.1):
+        """Initialize the detector.
+
+        Args:
+            on_threshold (float): How far above the baseline the force has to rise for a pop
+            off_threshold (float): How far above the baseline the force has to fall back to before the next pop
+            baseline_window (int): Over how many readings the baseline is taken, odd (~1 s at 500 readings/s)
+            refractory (float): Minimum time (s) between a pop and the previous one
+        """
+
+        self.__on = on_threshold
+        self.__off = off_threshold
+        self.__refractory = refractory
+        # the window is made odd, 2 * half + 1 readings
+        self.__half = baseline_window // 2
+        self.reset()
+
+    def reset(self):
+        """Forget the stream so far, e.g. for a new session."""
+
+        self.__tail = None
+        self.__pressed = False
+        self.__last_pop = -np.inf
+        self.__samples = 0
+        self.__pops = 0
+        self.__elapsed = 0.
+
+    @property
+    def samples_per_sec(self):
+        """Throughput of process(), in readings per second of processing time."""
+        return self.__samples / self.__elapsed if self.__elapsed > 0 else 0.
+
+    @property
+    def count(self):
+        """How many pops have been detected."""
+        return self.__pops
+
+    def process(self, timestamps, forces):
+        """Detect the pops starting in a batch of readings.
+
+        Args:
+            timestamps (np.ndarray): Time of each reading (s)
+            forces (np.ndarray): The force readings, oldest first
+
+        Returns:
+            np.ndarray: The start times (s) of the pops
+        """
+
+        start = time.perf_counter()
+        forces = np.asarray(forces, dtype=np.float64)
+        n = len(forces)
+        if n == 0:
+            return np.zeros(0)
+
+        if self.__tail is None:
+            # the stream starts with its first reading as the baseline
+            self.__tail = np.full(2 * self.__half, forces[0])
+        # the baseline of each reading is the minimum of the window ending at it; with the
+        # readings of the previous window in front there is a whole window for every reading
+        window = np.concatenate((self.__tail, forces))
+        baseline = _rolling_min(window, 2 * self.__half + 1)
+        self.__tail = window[n:]
+        excess = forces - baseline
+
+        # hysteresis: each reading takes the state of the last threshold crossed, if any, up to it
+        on = excess >= self.__on
+        off = excess < self.__off
+        last_crossing = np.maximum.accumulate(np.where(on | off, np.arange(n), -1))
+        pressed = np.where(last_crossing >= 0, on[np.maximum(last_crossing, 0)], self.__pressed)
+        edges = np.flatnonzero(pressed & ~np.concatenate(([self.__pressed], pressed[:-1])))
+        self.__pressed = bool(pressed[-1])
+
+        # the refractory period depends on the pops kept, but there are only a few edges per batch
+        pops = []
+        for t in np.asarray(timestamps, dtype=np.float64)[edges].tolist():
+            if t - self.__last_pop >= self.__refractory:
+                pops.append(t)
+                self.__last_pop = t
+
+        self.__samples += n
+        self.__pops += len(pops)
+        self.__elapsed += time.perf_counter() - start
+        return np.array(pops)
@@ -0,0 +1,79 @@
+import numpy as np
+from pop_detector import PopDetector
+
+rate = 500.                 # readings per second, as sent by the tattoo
+seconds = 10.
+
+def synthetic_trace(pop_times, seed=0):
+    """A resting force drifting from 100 to 200 with some noise, and a 60 ms press of +500 at each pop time."""
+
+    rng = np.random.default_rng(seed)
+    timestamps = np.arange(int(seconds * rate)) / rate
+    forces = 100 + 10 * timestamps + rng.normal(0, 5, len(timestamps))
+    for t in pop_times:
+        forces[(timestamps >= t) & (timestamps < t + 0.06)] += 500
+    return timestamps, forces
+
+def detect(timestamps, forces, batch_sizes, **kwargs):
+    """Run a detector over the trace split into consecutive batches of the given sizes (cycled)."""
+
+    detector = PopDetector(**kwargs)
+    pops, first, i = [], 0, 0
+    while first < len(forces):
+        last = first + batch_sizes[i % len(batch_sizes)]
+        pops.append(detector.process(timestamps[first:last], forces[first:last]))
+        first, i = last, i + 1
+    return np.concatenate(pops), detector
+
+pop_times = np.arange(1., seconds - 1, 0.5)
+timestamps, forces = synthetic_trace(pop_times)
+
+def test_detects_every_pop_on_a_drifting_baseline():
+    pops, detector = detect(timestamps, forces, [len(forces)])
+    assert len(pops) == len(pop_times) == detector.count
+    # the first reading of each press
+    assert np.all(np.abs(pops - pop_times) < 1.5 / rate)
+
+def test_batching_doesnt_change_the_pops():
+    whole, _ = detect(timestamps, forces, [len(forces)])
+    mixed, _ = detect(timestamps, forces, [1, 7, 120, 3, 600, 50, 2])
+    single, _ = detect(timestamps, forces, [1])
+    assert np.array_equal(whole, mixed)
+    assert np.array_equal(whole, single)
+
+def test_hysteresis_ignores_a_wobbling_press():
+    timestamps, forces = synthetic_trace([])
+    # rises past on_threshold, sags to between the thresholds, rises again: one pop
+    press = (timestamps >= 2.) & (timestamps < 2.2)
+    forces[press] += np.where(np.arange(np.count_nonzero(press)) % 20 < 10, 400, 200)
+    # released below off_threshold in between: a new pop, well past the refractory period
+    forces[(timestamps >= 4.) & (timestamps < 4.05)] += 400
+    forces[(timestamps >= 4.3) & (timestamps < 4.35)] += 400
+    pops, _ = detect(timestamps, forces, [64], refractory=0.1)
+    assert np.allclose(pops, [2., 4., 4.3])
+
+def test_refractory_period_merges_quick_presses():
+    # released and pressed again within 80 ms
+    timestamps, forces = synthetic_trace([3., 3.08, 6.])
+    pops, _ = detect(timestamps, forces, [64], refractory=0.1)
+    assert np.allclose(pops, [3., 6.])
+    pops, _ = detect(timestamps, forces, [64], refractory=0.05)
+    assert np.allclose(pops, [3., 3.08, 6.])
+
+def test_reset_forgets_the_stream():
+    detector = PopDetector()
+    first = detector.process(timestamps, forces)
+    detector.reset()
+    assert detector.count == 0
+    assert np.array_equal(detector.process(timestamps, forces), first)
+
+if __name__ == '__main__':
+    long_timestamps = np.arange(int(600 * rate)) / rate
+    long_forces = np.tile(forces, int(600 / seconds))
+    for batch in (1, 16, 256, len(long_forces)):
+        if batch == 1:
+            # too slow for the whole trace, one minute of it
+            _, detector = detect(long_timestamps[:int(60 * rate)], long_forces[:int(60 * rate)], [batch])
+        else:
+            _, detector = detect(long_timestamps, long_forces, [batch])
+        print('batches of {0:>6}: {1:.3f} M readings/s'.format(batch, detector.samples_per_sec / 1e6))
@@ -0,0 +1,338 @@
+"""Replay captured sensor traces against their WAV files, without a sensor or a sound card.
+
+A ReplaySource stands in for the serial port and for pyaudio, so Dance2Music and
+Pop_on_Beat run their usual processing on a recorded trace: either paced like the
+live session (speed=1.0, or faster) or as fast as possible without rendering
+(speed=None), e.g. to score a batch of past sessions:
+
+    python replay.py West_Bubbles.wav sessions/*/
+"""
+import os
+import time
+import argparse
+import threading
+import numpy as np
+from session_recorder import open_session
+from sensor_protocol import encode_readings
+
+paContinue = 0
+paComplete = 1
+
+def _is_numeric_row(line):
+    """Whether a CSV line holds numbers (e.g. 1.0e+02) rather than the column names."""
+
+    try:
+        [float(field) for field in line.split(',')]
+    except ValueError:
+        return False
+    return True
+
+def load_trace(path, dancer=0):
+    """Load a captured sensor trace.
+
+    Args:
+        path (str): A session directory of session_recorder, or a CSV file of 'time,force' rows (s, 0 - 1023)
+        dancer (int): Whose readings to load from a session of several dancers
+
+    Returns:
+        (np.ndarray, np.ndarray): The timestamps (s, on the audio clock) and the force readings, sorted by time
+    """
+
+    if os.path.isdir(path):
+        _, streams = open_session(path)
+        sensor = streams['sensor']
+        times, forces = sensor['time'], sensor['force']
+        if 'dancer' in sensor:
+            mine = sensor['dancer'] == dancer
+            times, forces = times[mine], forces[mine]
+    else:
+        with open(path) as f:
+            header = f.readline()
+        skiprows = 0 if _is_numeric_row(header) else 1
+        rows = np.loadtxt(path, delimiter=',', ndmin=2, skiprows=skiprows)
+        times, forces = rows[:, 0], rows[:, 1]
+
+    order = np.argsort(times, kind='stable')
+    return np.asarray(times, dtype=np.float64)[order], np.asarray(forces, dtype=np.int16)[order]
+
+class ReplaySource:
+    """The timeline of a replayed session, and the look-alikes of its devices.
+
+    Its clock starts at 0 when the audio stream starts and reads as the position in
+    the audio, which is also the time base of the trace: a reading is delivered once
+    the clock reaches its timestamp. With a speed the clock follows time.monotonic(),
+    scaled; as fast as possible (speed None) it only advances with the audio played,
+    one stream buffer at a time, which makes a replay fully deterministic.
+    """
+
+    def __init__(self, trace, protocol='ascii', speed=1.0):
+        """Load the trace.
+
+        Args:
+            trace (str or tuple): Path of the trace (see load_trace()), or its (timestamps, forces) arrays
+            protocol (str): Either 'ascii' or 'binary', how the readings are encoded for the decoders
+            speed (float): Playback speed, 1.0 for real time, None for as fast as possible
+        """
+
+        self.__times, self.__forces = load_trace(trace) if isinstance(trace, str) else trace
+        self.__protocol = protocol
+        self.__speed = speed
+        self.__rate = None
+        self.__t0 = None
+        self.__frames = 0
+        self.serial = ReplaySerial(self)
+        self.pa = ReplayPyAudio(self)
+
+    @property
+    def realtime(self):
+        """Whether the replay is paced by the wall clock (and rendered)."""
+        return self.__speed is not None
+
+    @property
+    def speed(self):
+        return self.__speed
+
+    @property
+    def protocol(self):
+        return self.__protocol
+
+    def now(self):
+        """The replay clock (s): 0 until the audio starts, then the position in the audio."""
+
+        if self.__t0 is None:
+            return 0.
+        if self.__speed is None:
+            return self.__frames / float(self.__rate)
+        return (time.monotonic() - self.__t0) * self.__speed
+
+    def start(self, rate):
+        """Start the clock, as the audio stream starts (stream side).
+
+        Args:
+            rate (int): Sampling rate of the audio
+        """
+
+        if self.__t0 is None:
+            self.__rate = rate
+            self.__frames = 0
+            self.__t0 = time.monotonic()
+
+    def advance(self, n_frames):
+        """Account for audio frames played (stream side)."""
+        self.__frames += n_frames
+
+    def due(self):
+        """How many readings of the trace are due by now."""
+        return int(np.searchsorted(self.__times, self.now(), side='right'))
+
+    def readings(self, first, last):
+        """The (timestamps, forces) of the readings [first, last) of the trace."""
+        return self.__times[first:last], self.__forces[first:last]
+
+    def acquisition(self, decoder):
+        """A serial_acquire.MultiSerialAcquisition look-alike delivering the trace, see ReplayAcquisition.
+
+        Args:
+            decoder: Decoder of the protocol of this source, see sensor_protocol.make_decoder()
+        """
+
+        return ReplayAcquisition(self, decoder)
+
+class ReplaySerial:
+    """A serial.Serial look-alike that receives the readings of a ReplaySource as they fall due,
+    encoded in its protocol.
+    """
+
+    port = 'replay'
+
+    def __init__(self, source):
+        self.__source = source
+        self.__sent = 0
+        self.__pending = b''
+
+    def __receive(self):
+        due = self.__source.due()
+        if due > self.__sent:
+            _, forces = self.__source.readings(self.__sent, due)
+            self.__pending += encode_readings(forces, self.__source.protocol)
+            self.__sent = due
+
+    @property
+    def in_waiting(self):
+        self.__receive()
+        return len(self.__pending)
+
+    def read(self, size=1):
+        """Read up to size bytes, without blocking: only what's due by now is there."""
+
+        self.__receive()
+        data, self.__pending = self.__pending[:size], self.__pending[size:]
+        return data
+
+    def close(self):
+        pass
+
+class ReplayAcquisition:
+    """A serial_acquire.MultiSerialAcquisition look-alike for a ReplaySource, with a single port.
+
+    The readings go through the protocol encoding and the decoder like live ones,
+    but keep the timestamps of the trace instead of being stamped on arrival, so a
+    replay as fast as possible places them exactly where they were recorded.
+    """
+
+    def __init__(self, source, decoder):
+        self.__source = source
+        self.__decoder = decoder
+        self.__sent = 0
+
+    def __len__(self):
+        return 1
+
+    @property
+    def dropped(self):
+        """Nothing is ever dropped, the trace is read as it's drained."""
+        return [0]
+
+    def start(self):
+        self.__sent = 0
+
+    def stop(self):
+        pass
+
+    def drain(self, i=0):
+        """Get the readings due since the last call, as (timestamps, forces) arrays.
+
+        Args:
+            i (int): Index of the sensor, a replay only has the one
+        """
+
+        due = self.__source.due()
+        times, forces = self.__source.readings(self.__sent, due)
+        self.__sent = due
+        forces = self.__decoder.decode(encode_readings(forces, self.__source.protocol))
+        return times[:len(forces)], forces
+
+class ReplayStream:
+    """A pyaudio.Stream look-alike that plays to the clock of a ReplaySource.
+
+    In callback mode, a replay paced in real time calls the callback from a thread like
+    PortAudio does, while a replay as fast as possible calls it once per is_active(), in
+    lock step with the loop polling it. Blocking writes return once the clock has caught
+    up with the audio written (at once as fast as possible).
+    """
+
+    def __init__(self, source, rate, bytes_per_frame, stream_callback=None, frames_per_buffer=1024):
+        self.__source = source
+        self.__rate = rate
+        self.__bytes_per_frame = bytes_per_frame
+        self.__callback = stream_callback
+        self.__frames_per_buffer = frames_per_buffer
+        self.__frames = 0
+        self.__active = False
+
+    def __pump(self):
+        """Call the callback for the next buffer, returning whether the stream goes on."""
+
+        now = self.__source.now()
+        time_info = {'current_time': now, 'output_buffer_dac_time': now}
+        data, flag = self.__callback(None, self.__frames_per_buffer, time_info, 0)
+        n = len(data) // self.__bytes_per_frame
+        self.__frames += n
+        self.__source.advance(n)
+        return flag == paContinue and n == self.__frames_per_buffer
+
+    def __run(self):
+        while self.__active:
+            if not self.__pump():
+                self.__active = False
+                break
+            # play the buffer to the replay clock
+            time.sleep(max(0., (self.__frames / float(self.__rate) - self.__source.now()) / self.__source.speed))
+
+    def start_stream(self):
+        self.__source.start(self.__rate)
+        self.__active = True
+        if self.__callback is not None and self.__source.realtime:
+            threading.Thread(target=self.__run, daemon=True).start()
+
+    def is_active(self):
+        if self.__active and self.__callback is not None and not self.__source.realtime:
+            self.__active = self.__pump()
+            # the loop still gets to process the last buffer
+            return True
+        return self.__active
+
+    def write(self, frames):
+        self.__source.start(self.__rate)
+        n = len(frames) // self.__bytes_per_frame
+        self.__frames += n
+        self.__source.advance(n)
+        if self.__source.realtime:
+            time.sleep(max(0., (self.__frames / float(self.__rate) - self.__source.now()) / self.__source.speed))
+
+    def get_output_latency(self):
+        return 0.
+
+    def stop_stream(self):
+        self.__active = False
+
+    def close(self):
+        self.__active = False
+
+class ReplayPyAudio:
+    """A pyaudio.PyAudio look-alike whose streams are ReplayStreams of one ReplaySource."""
+
+    def __init__(self, source):
+        self.__source = source
+
+    def get_format_from_width(self, width):
+        return width
+
+    def open(self, format, channels, rate, output=False, input=False, stream_callback=None,
+             frames_per_buffer=1024, **kwargs):
+        if input:
+            raise ValueError('A replay has no audio input')
+        return ReplayStream(self.__source, rate, channels * format, stream_callback, frames_per_buffer)
+
+    def terminate(self):
+        pass
+
+def score_traces(audio_filename, traces, protocol='ascii', tolerance=0.07):
+    """Replay traces as fast as possible through Dance2Music and score each one.
+
+    Args:
+        audio_filename (str): The WAV file the traces were danced to
+        traces (list): Paths of the traces, see load_trace()
+        protocol (str): Either 'ascii' or 'binary', the encoding the readings go through
+        tolerance (float): How far (s) from the nearest beat a pop still counts as a hit
+
+    Returns:
+        list: The AlignmentScore of every trace
+    """
+
+    from dance2music import Dance2Music
+    from onset_cache import OnsetCache
+
+    cache = OnsetCache()
+    scores = []
+    for trace in traces:
+        session = Dance2Music(None, None, audio_filename, protocol=protocol, replay=ReplaySource(trace, protocol, None))
+        # a view into the mapped file, analyzed only when the envelope isn't cached yet
+        session.get_audio_waveform()
+        session.get_onset_envelope(cache)
+        session.get_down()
+        scores.append(session.score_pops(tolerance))
+    return scores
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('audio', help='WAV file the traces were danced to')
+    parser.add_argument('traces', nargs='+', help='session directories or time,force CSV files')
+    parser.add_argument('--protocol', default='ascii', choices=['ascii', 'binary'])
+    parser.add_argument('--tolerance', type=float, default=0.07, help='largest offset (s) of a hit')
+    args = parser.parse_args()
+
+    scores = score_traces(args.audio, args.traces, args.protocol, args.tolerance)
+    for trace, score in zip(args.traces, scores):
+        print('{0}: {1} pops, hit rate {2:.0%}, mean offset {3:.1f} ms, beats hit {4:.0%}'.format(
+            trace, len(score.offsets), score.hit_rate, 1000 * score.mean_abs_offset, score.beats_hit))
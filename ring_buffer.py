@@ -0,0 +1,180 @@
+import os
+import numpy as np
+from multiprocessing import shared_memory
+
+class RingBuffer:
+    """A fixed-capacity rolling window of samples, e.g. the data shown on a plot.
+
+    The storage is preallocated twice the capacity and every sample is written to both
+    halves, so the window is always available as one contiguous view (no copy, no
+    reallocation) no matter where its oldest sample currently sits.
+    """
+
+    def __init__(self, capacity, dtype=np.float64, fill=0.):
+        """Initialize the buffer, full of the fill value.
+
+        Args:
+            capacity (int): How many samples the window holds
+            dtype (np.dtype): Data type of the samples
+            fill (float): Initial value of the samples
+        """
+
+        self.__capacity = capacity
+        self.__data = np.full(2 * capacity, fill, dtype=dtype)
+        self.__start = 0    # index of the oldest sample
+
+    def __len__(self):
+        return self.__capacity
+
+    def append(self, sample):
+        """Append one sample, dropping the oldest one.
+
+        Args:
+            sample (float): The new sample
+        """
+
+        self.__data[self.__start] = sample
+        self.__data[self.__start + self.__capacity] = sample
+        self.__start = (self.__start + 1) % self.__capacity
+
+    def extend(self, samples):
+        """Append a batch of samples, dropping as many of the oldest ones.
+
+        Args:
+            samples (np.ndarray): 1D array of new samples, oldest first
+        """
+
+        # only the newest capacity samples can survive
+        samples = np.asarray(samples)[-self.__capacity:]
+        n = len(samples)
+        cap = self.__capacity
+        start = self.__start
+
+        # the new samples overwrite the oldest ones, wrapping around at the capacity
+        first = min(n, cap - start)
+        self.__data[start:start + first] = samples[:first]
+        self.__data[start + cap:start + cap + first] = samples[:first]
+        rest = n - first
+        self.__data[:rest] = samples[first:]
+        self.__data[cap:cap + rest] = samples[first:]
+
+        self.__start = (start + n) % cap
+
+    def fill(self, sample, n):
+        """Append the same sample n times, dropping as many of the oldest ones.
+
+        Args:
+            sample (float): The value to append
+            n (int): How many times to append it
+        """
+
+        n = min(n, self.__capacity)
+        if n <= 0:
+            return
+        cap = self.__capacity
+        start = self.__start
+
+        first = min(n, cap - start)
+        self.__data[start:start + first] = sample
+        self.__data[start + cap:start + cap + first] = sample
+        rest = n - first
+        self.__data[:rest] = sample
+        self.__data[cap:cap + rest] = sample
+
+        self.__start = (start + n) % cap
+
+    def view(self):
+        """Get the window, oldest sample first, as a contiguous view into the buffer.
+
+        The view is only valid until the next append, copy it if it needs to be kept.
+        """
+
+        return self.__data[self.__start:self.__start + self.__capacity]
+
+class SharedRingBuffer:
+    """A ring buffer in shared memory, for streaming samples from one process to another.
+
+    A single writer appends samples and bumps a running sample count stored in
+    front of the data; a reader remembers the count it has read up to and asks for
+    everything written since. A reader lagging behind by more than the capacity
+    only gets the newest capacity samples.
+
+    The buffer can be passed to a multiprocessing.Process, the child attaches to
+    the same shared memory block.
+    """
+
+    def __init__(self, capacity, dtype=np.float64, name=None):
+        """Create a shared memory block, or attach to an existing one.
+
+        Args:
+            capacity (int): How many samples the buffer holds
+            dtype (np.dtype): Data type of the samples
+            name (str): Name of the shared memory block to attach to, None to create a new one
+        """
+
+        self.__capacity = capacity
+        self.__dtype = np.dtype(dtype)
+        # the creating process frees the memory, even if a forked child inherits this object
+        self.__owner_pid = os.getpid() if name is None else None
+        nbytes = 8 + capacity * self.__dtype.itemsize
+        self.__shm = shared_memory.SharedMemory(name=name, create=name is None, size=nbytes)
+
+        self.__count = np.ndarray((1,), dtype=np.int64, buffer=self.__shm.buf)
+        self.__data = np.ndarray((capacity,), dtype=self.__dtype, buffer=self.__shm.buf, offset=8)
+        if name is None:
+            self.__count[0] = 0
+
+    def __reduce__(self):
+        # a child process attaches by name instead of copying the data
+        return (self.__class__, (self.__capacity, self.__dtype.str, self.__shm.name))
+
+    @property
+    def count(self):
+        """How many samples have been written so far."""
+        return int(self.__count[0])
+
+    def extend(self, samples):
+        """Append a batch of samples (writer side).
+
+        Args:
+            samples (np.ndarray): 1D array of new samples, oldest first
+        """
+
+        cap = self.__capacity
+        samples = np.asarray(samples)
+        # only the newest capacity samples can survive, but all of them are counted
+        skipped = max(0, len(samples) - cap)
+        samples = samples[skipped:]
+        n = len(samples)
+        start = (self.__count[0] + skipped) % cap
+
+        first = min(n, cap - start)
+        self.__data[start:start + first] = samples[:first]
+        self.__data[:n - first] = samples[first:]
+        # publish the samples only once they're in place
+        self.__count[0] += skipped + n
+
+    def read(self, since):
+        """Get the samples written since a given count (reader side).
+
+        Args:
+            since (int): The count returned by the previous read, 0 at first
+
+        Returns:
+            (np.ndarray, int): A copy of the new samples, and the count to pass to the next read
+        """
+
+        count = self.count
+        n = min(count - since, self.__capacity)
+        start = (count - n) % self.__capacity
+        indices = (start + np.arange(n)) % self.__capacity
+        return self.__data[indices], count
+
+    def close(self):
+        """Detach from the shared memory, and free it if this is the buffer that created it."""
+
+        self.__count = None
+        self.__data = None
+        self.__shm.close()
+        if self.__owner_pid == os.getpid():
+            self.__shm.unlink()
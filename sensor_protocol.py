@@ -0,0 +1,176 @@
+import numpy as np
+
+# Binary framing, 3 bytes per reading (8 data bits on the wire):
+#   byte 0: sync byte 0xA5
+#   byte 1: 6-bit checksum << 2 | bits 9-8 of the reading
+#   byte 2: bits 7-0 of the reading
+# with checksum = ~(high bits + low byte) & 0x3F
+FRAME_SYNC = 0xA5
+FRAME_LENGTH = 3
+
+def frame_checksum(hi, lo):
+    """6-bit checksum of a binary frame, given the high bits and the low byte of the reading."""
+    return ~(hi.astype(np.int32) + lo) & 0x3F
+
+def encode_frames(forces):
+    """Encode force readings (0 - 1023) into binary frames, e.g. to emulate the sensor.
+
+    Args:
+        forces (np.ndarray): The force readings
+
+    Returns:
+        bytes: The framed readings
+    """
+
+    forces = np.asarray(forces, dtype=np.uint16) & 0x3FF
+    hi = forces >> 8
+    lo = forces & 0xFF
+
+    frames = np.empty((len(forces), FRAME_LENGTH), dtype=np.uint8)
+    frames[:, 0] = FRAME_SYNC
+    frames[:, 1] = (frame_checksum(hi, lo) << 2) | hi
+    frames[:, 2] = lo
+    return frames.tobytes()
+
+def encode_lines(forces):
+    """Encode force readings into ASCII lines like the ones the sensor prints, e.g. to emulate it.
+
+    Args:
+        forces (np.ndarray): The force readings
+
+    Returns:
+        bytes: The readings, one 'force 0' line each
+    """
+
+    return b''.join(b'%d 0\r\n' % force for force in np.asarray(forces).tolist())
+
+def encode_readings(forces, protocol):
+    """Encode force readings the way a sensor protocol sends them.
+
+    Args:
+        forces (np.ndarray): The force readings
+        protocol (str): Either 'ascii' or 'binary'
+    """
+
+    if protocol == 'binary':
+        return encode_frames(forces)
+    elif protocol == 'ascii':
+        return encode_lines(forces)
+    raise ValueError('Unknown sensor protocol {0!r}'.format(protocol))
+
+def make_decoder(protocol):
+    """Get the decoder of a sensor protocol.
+
+    Args:
+        protocol (str): Either 'ascii' or 'binary'
+    """
+
+    if protocol == 'binary':
+        return BinaryDecoder()
+    elif protocol == 'ascii':
+        return AsciiDecoder()
+    raise ValueError('Unknown sensor protocol {0!r}'.format(protocol))
+
+class AsciiDecoder:
+    """Decoder of the ASCII sensor output, one reading per line with the force
+    (0 - 1023) as its first space-separated field.
+
+    Bytes can be fed in arbitrary pieces, an incomplete line is carried over to
+    the next call.
+    """
+
+    def __init__(self):
+        self.__carry = b''
+
+    def decode(self, data):
+        """Decode a piece of the serial byte stream.
+
+        Args:
+            data (bytes): The bytes read from the serial port
+
+        Returns:
+            np.ndarray: The force readings of the lines completed by data (malformed lines are skipped)
+        """
+
+        lines = (self.__carry + data).split(b'\n')
+        self.__carry = lines.pop()
+
+        forces = []
+        for sensor_data in lines:
+            data_string = sensor_data.strip().decode('UTF-8', 'ignore')
+            data_array = data_string.split(' ')
+            if data_array[0].isdigit():
+                forces.append(int(data_array[0]))
+        return np.array(forces, dtype=np.int16)
+
+class BinaryDecoder:
+    """Decoder of the binary sensor output (see FRAME_SYNC for the frame layout).
+
+    While in sync the frames are decoded all at once by viewing the bytes as a
+    (frames x 3) array; a scan for the next valid sync byte only happens after a
+    corrupted or lost byte. Incomplete frames are carried over to the next call.
+    """
+
+    def __init__(self):
+        self.__carry = b''
+        self.__errors = 0
+
+    @property
+    def errors(self):
+        """How many times a corrupted frame made the decoder lose sync."""
+        return self.__errors
+
+    @staticmethod
+    def __valid(frames):
+        """Which rows of a (frames x 3) byte array are valid frames."""
+
+        hi = frames[:, 1] & 0x03
+        return (frames[:, 0] == FRAME_SYNC) & ((frames[:, 1] >> 2) == frame_checksum(hi, frames[:, 2]))
+
+    def decode(self, data):
+        """Decode a piece of the serial byte stream.
+
+        Args:
+            data (bytes): The bytes read from the serial port
+
+        Returns:
+            np.ndarray: The force readings of the frames completed by data
+        """
+
+        buf = np.frombuffer(self.__carry + data, dtype=np.uint8)
+        forces = []
+        pos = 0
+
+        while len(buf) - pos >= FRAME_LENGTH:
+            # find the first valid frame from pos on
+            starts = pos + np.flatnonzero(buf[pos:len(buf) - FRAME_LENGTH + 1] == FRAME_SYNC)
+            if len(starts) == 0:
+                pos = len(buf) - FRAME_LENGTH + 1
+                break
+            candidates = buf[starts[:, np.newaxis] + np.arange(FRAME_LENGTH)]
+            valid_starts = starts[self.__valid(candidates)]
+            if len(valid_starts) == 0:
+                pos = len(buf) - FRAME_LENGTH + 1
+                break
+            start = valid_starts[0]
+
+            # decode every frame in line with it, up to the first invalid one
+            n_frames = (len(buf) - start) // FRAME_LENGTH
+            frames = buf[start:start + n_frames * FRAME_LENGTH].reshape(n_frames, FRAME_LENGTH)
+            invalid = np.flatnonzero(~self.__valid(frames))
+            n_valid = n_frames if len(invalid) == 0 else invalid[0]
+
+            frames = frames[:n_valid]
+            forces.append(((frames[:, 1] & 0x03).astype(np.int16) << 8) | frames[:, 2])
+            pos = start + n_valid * FRAME_LENGTH
+            if n_valid < n_frames:
+                # out of sync, look for the next sync byte
+                self.__errors += 1
+                pos += 1
+
+        # keep what might still be the beginning of a frame
+        self.__carry = buf[pos:].tobytes()
+
+        if not forces:
+            return np.zeros(0, dtype=np.int16)
+        return np.concatenate(forces)
@@ -0,0 +1,73 @@
+import time
+import numpy as np
+from sensor_protocol import encode_readings, make_decoder, AsciiDecoder, BinaryDecoder, FRAME_LENGTH
+
+rng = np.random.default_rng(0)
+forces = rng.integers(0, 1024, 2000).astype(np.int16)
+
+def decode_in_pieces(decoder, data, sizes):
+    """Feed data to the decoder in consecutive pieces of the given sizes (cycled)."""
+
+    decoded, first, i = [], 0, 0
+    while first < len(data):
+        last = first + sizes[i % len(sizes)]
+        decoded.append(decoder.decode(data[first:last]))
+        first, i = last, i + 1
+    return np.concatenate(decoded)
+
+def test_round_trip():
+    for protocol in ('ascii', 'binary'):
+        decoded = make_decoder(protocol).decode(encode_readings(forces, protocol))
+        assert decoded.dtype == np.int16
+        assert np.array_equal(decoded, forces)
+
+def test_arbitrary_chunking():
+    for protocol in ('ascii', 'binary'):
+        data = encode_readings(forces, protocol)
+        for sizes in ([1], [2], [FRAME_LENGTH + 1], [5, 1, 64, 2, 7, 300]):
+            assert np.array_equal(decode_in_pieces(make_decoder(protocol), data, sizes), forces)
+
+def test_binary_corrupted_bytes_lose_their_frames():
+    data = bytearray(encode_readings(forces, 'binary'))
+    corrupted = [10, 500, 501, 1999]
+    # a different byte of the frame every time; the checksum catches each of them
+    for i, frame in enumerate(corrupted):
+        data[frame * FRAME_LENGTH + i % FRAME_LENGTH] ^= 0x5A
+    decoder = BinaryDecoder()
+    decoded = decode_in_pieces(decoder, bytes(data), [1, 37, 512])
+    assert np.array_equal(decoded, np.delete(forces, corrupted))
+    # the decoder loses sync once for the two frames in a row
+    assert decoder.errors == 3
+
+def test_binary_dropped_bytes_resync():
+    data = bytearray(encode_readings(forces, 'binary'))
+    # the last byte of frame 700, then the first two of frame 300 (deleted back to front)
+    for index in (700 * FRAME_LENGTH + 2, 300 * FRAME_LENGTH + 1, 300 * FRAME_LENGTH):
+        del data[index]
+    decoded = decode_in_pieces(BinaryDecoder(), bytes(data), [64])
+    assert np.array_equal(decoded, np.delete(forces, [300, 700]))
+
+def test_binary_garbage_before_the_first_frame():
+    data = bytes([0xA5, 0x00, 0xA5, 0x12]) + encode_readings(forces[:10], 'binary')
+    assert np.array_equal(BinaryDecoder().decode(data), forces[:10])
+
+def test_ascii_partial_lines():
+    decoder = AsciiDecoder()
+    assert len(decoder.decode(b'512 0\r\n51')) == 1
+    assert np.array_equal(decoder.decode(b'3 0\r'), np.zeros(0))
+    assert np.array_equal(decoder.decode(b'\n7'), [513])
+    # a malformed line is skipped, the incomplete one kept for later
+    assert np.array_equal(decoder.decode(b' 0\r\nx12 0\r\n\r\n1023 0\r\n4'), [7, 1023])
+    assert np.array_equal(decoder.decode(b'\n'), [4])
+
+if __name__ == '__main__':
+    # a second of readings at 500/s, as one piece and as the pieces of a busy loop
+    readings = np.tile(forces, 5)[:500]
+    for protocol in ('ascii', 'binary'):
+        data = encode_readings(readings, protocol)
+        for size in (len(data), 64, 1):
+            decoder = make_decoder(protocol)
+            start = time.perf_counter()
+            decode_in_pieces(decoder, data, [size])
+            print('{0:<6} pieces of {1:>5} bytes: {2:.2f} ms per second of readings'.format(
+                protocol, size, 1000 * (time.perf_counter() - start)))
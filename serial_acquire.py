@@ -0,0 +1,139 @@
+import time
+import selectors
+import threading
+import numpy as np
+from collections import deque
+from sensor_protocol import AsciiDecoder
+
+class MultiSerialAcquisition:
+    """One background thread draining several serial ports at once, e.g. a sensor per dancer.
+
+    Where the ports have file descriptors (POSIX) the thread sleeps in a selector until
+    any of them has data; elsewhere (Windows COM ports) it polls in_waiting of every port
+    and naps briefly when all are idle. Either way no read blocks on one port while
+    another one has data. Every batch of readings is stamped with the shared clock as
+    it's read and queued per port, a whole batch at a time; its readings are spread
+    evenly from the stamp of the previous batch of the port up to its own, as they
+    arrived in between (USB serial adapters deliver them a few ms at a time).
+    """
+
+    def __init__(self, sers, decoders=None, maxlen=65536, clock=time.monotonic):
+        """Initialize the per-port queues.
+
+        Args:
+            sers (list): The opened serial ports (serial.Serial), with a read timeout
+            decoders (list): Turns the raw bytes of each port into force readings, AsciiDecoders by default
+            maxlen (int): How many readings are queued per port at most before the oldest ones are dropped
+            clock (callable): The time base (s) the readings of all ports are stamped with
+        """
+
+        self.__sers = list(sers)
+        self.__decoders = [AsciiDecoder() for _ in self.__sers] if decoders is None else list(decoders)
+        self.__maxlen = maxlen
+        self.__clock = clock
+        self.__queues = [deque() for _ in self.__sers]
+        self.__last_stamps = [None] * len(self.__sers)
+        self.__queued = [0] * len(self.__sers)
+        self.__dropped = [0] * len(self.__sers)
+        self.__locks = [threading.Lock() for _ in self.__sers]
+        self.__running = threading.Event()
+        self.__thread = None
+
+    def __len__(self):
+        return len(self.__sers)
+
+    @property
+    def dropped(self):
+        """How many readings were dropped because a queue was full, per port."""
+        return list(self.__dropped)
+
+    def start(self):
+        """Start draining the serial ports."""
+
+        self.__last_stamps = [None] * len(self.__sers)
+        self.__running.set()
+        try:
+            fds = [ser.fileno() for ser in self.__sers]
+        except (AttributeError, OSError):
+            fds = None
+        target = self.__run_polling if fds is None else self.__run_selector
+        self.__thread = threading.Thread(target=target, args=() if fds is None else (fds,), daemon=True)
+        self.__thread.start()
+
+    def stop(self):
+        """Stop draining the serial ports and wait for the thread to finish."""
+
+        self.__running.clear()
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
+
+    def __receive(self, i):
+        """Read, stamp, decode and queue whatever is waiting at port i, returning whether there was any."""
+
+        ser = self.__sers[i]
+        data = ser.read(ser.in_waiting)
+        if not data:
+            return False
+        timestamp = self.__clock()
+
+        forces = self.__decoders[i].decode(data)
+        if len(forces) == 0:
+            return True
+        # the first batch has nothing to be spread from, its readings all get its stamp
+        previous = timestamp if self.__last_stamps[i] is None else self.__last_stamps[i]
+        self.__last_stamps[i] = timestamp
+        with self.__locks[i]:
+            self.__queues[i].append((previous, timestamp, forces))
+            self.__queued[i] += len(forces)
+            # drop the oldest batches, the newest one stays whatever its size
+            while self.__queued[i] > self.__maxlen and len(self.__queues[i]) > 1:
+                _, _, old = self.__queues[i].popleft()
+                self.__queued[i] -= len(old)
+                self.__dropped[i] += len(old)
+        return True
+
+    def __run_selector(self, fds):
+        """Thread body on POSIX: wait for any port to become readable."""
+
+        selector = selectors.DefaultSelector()
+        for i, fd in enumerate(fds):
+            selector.register(fd, selectors.EVENT_READ, i)
+        while self.__running.is_set():
+            for key, _ in selector.select(timeout=0.1):
+                if not self.__receive(key.data):
+                    # readable but nothing to read: the port hung up, don't spin on it
+                    time.sleep(0.001)
+        selector.close()
+
+    def __run_polling(self):
+        """Thread body elsewhere: poll every port, napping while all of them are idle."""
+
+        while self.__running.is_set():
+            received = False
+            for i in range(len(self.__sers)):
+                received = self.__receive(i) or received
+            if not received:
+                time.sleep(0.001)
+
+    def drain(self, i=0):
+        """Take every reading of a port queued since the last call.
+
+        Args:
+            i (int): Index of the port
+
+        Returns:
+            (np.ndarray, np.ndarray): The timestamps (in s) and the force readings
+        """
+
+        with self.__locks[i]:
+            batches = list(self.__queues[i])
+            self.__queues[i].clear()
+            self.__queued[i] = 0
+
+        if not batches:
+            return np.zeros(0), np.zeros(0, dtype=np.int16)
+        # the last reading of a batch arrived at its stamp, the others in between it and the previous one
+        timestamps = np.concatenate([np.linspace(previous, t, len(forces) + 1)[1:] for previous, t, forces in batches])
+        forces = np.concatenate([forces for _, _, forces in batches]).astype(np.int16)
+        return timestamps, forces
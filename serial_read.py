@@ -1,50 +1,55 @@
-import time
 import serial
 import numpy as np
 import matplotlib.pyplot as plt
+from ring_buffer import RingBuffer
+from sensor_protocol import make_decoder
+from blit_renderer import BlitRenderer
+from instrument import StageTimer
+
+protocol = 'ascii'     # or 'binary' for the compact framing, see sensor_protocol
 
 ser = serial.Serial(
     port='COM3',
     baudrate=19200,
     parity=serial.PARITY_ODD,
     stopbits=serial.STOPBITS_TWO,
-    bytesize=serial.SEVENBITS
+    bytesize=serial.EIGHTBITS if protocol == 'binary' else serial.SEVENBITS
 )
+decoder = make_decoder(protocol)
 
 # fig, ax = plt.subplots()
 fig = plt.figure()
 ax = plt.axes()
 ax.set_ylim(0, 1023)
-ys = 50 * [0.0]
+ys = RingBuffer(50)
 force = 0
-line, = ax.plot(ys, 'r-')
+line, = ax.plot(ys.view(), 'r-')
+renderer = BlitRenderer(fig, [line], show_fps=True)
 
 sample_count = 0
-start_time = time.time()
-end_time = time.time()
+timers = StageTimer(('sensor', 'render'))
 fig.show()
 
-while True:
-    start_time = time.time()
-
-    sensor_data = ser.readline()
-    data_string = sensor_data.strip().decode('UTF-8')
-    data_array = data_string.split(' ')
-    # print(data_array)
+try:
+    while True:
+        t = timers.now()
 
-    if data_array[0].isdigit():# len(data_array) < 2:
-        force = int(data_array[0])
-        # print(force)
-    ys.append(force)
+        # read everything waiting at the port (at least one byte)
+        sensor_data = ser.read(max(1, ser.in_waiting))
+        forces = decoder.decode(sensor_data)
 
-    sample_count += 1
-    if len(ys) > 50:
-        ys.pop(0)
+        if len(forces) > 0:
+            force = forces[-1]
+            ys.extend(forces)
 
-    end_time = time.time()
-    # print('time cost', end_time - start_time, 's')
+        sample_count += len(forces)
+        t = timers.lap('sensor', t)
 
-    line.set_ydata(ys)
-    fig.canvas.draw()
-    fig.canvas.flush_events()
+        line.set_ydata(ys.view())
+        renderer.draw()
+        timers.lap('render', t)
+except KeyboardInterrupt:
+    # Ctrl-C stops reading, print where the time went
+    print(sample_count, 'readings')
+    print(timers.summary_text())
 
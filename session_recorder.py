@@ -0,0 +1,138 @@
+import os
+import json
+import numpy as np
+
+# the streams of a Dance2Music session and their columns
+SESSION_SCHEMA = {
+    'sensor': [('time', '<f8'), ('force', '<i2'), ('dancer', 'u1')],    # force readings, on the audio clock (s)
+    'frames': [('time', '<f8'), ('audio_time', '<f8')],                 # per frame: monotonic time and audio clock (s)
+    'pops': [('time', '<f8'), ('dancer', 'u1')],                        # detected pops, on the audio clock (s)
+}
+
+MANIFEST_FILENAME = 'session.json'
+
+def _column_filename(stream, column):
+    return '{0}.{1}.bin'.format(stream, column)
+
+class SessionRecorder:
+    """A columnar binary log of a session, one raw little-endian file per column.
+
+    Samples are appended to preallocated in-memory chunks, which are written out
+    whenever one fills up (no fsync), so recording costs a copy into a buffer per
+    append and nothing else in the session loop. The manifest (schema and metadata)
+    is written up front and the lengths follow from the file sizes, so a session
+    cut short by a crash is still readable up to its last flushed chunk. See
+    open_session() for reading it back as memory-mapped arrays.
+    """
+
+    def __init__(self, path, schema=SESSION_SCHEMA, meta=None, chunk=4096):
+        """Create the session directory, its manifest and its column files.
+
+        Args:
+            path (str): Directory of the session, created if needed; existing columns are overwritten
+            schema (dict): stream name -> list of (column name, NumPy dtype string)
+            meta (dict): JSON-serializable metadata of the session (e.g. audio file, sampling rate)
+            chunk (int): How many rows of each stream are buffered before being written out
+        """
+
+        self.__chunk = chunk
+        self.__buffers = {}
+        self.__files = {}
+        self.__fill = {}
+        os.makedirs(path, exist_ok=True)
+
+        with open(os.path.join(path, MANIFEST_FILENAME), 'w') as f:
+            json.dump({'schema': schema, 'meta': meta or {}}, f, indent=2)
+
+        for stream, columns in schema.items():
+            self.__buffers[stream] = [np.empty(chunk, dtype=dtype) for _, dtype in columns]
+            self.__files[stream] = [open(os.path.join(path, _column_filename(stream, name)), 'wb')
+                                    for name, _ in columns]
+            self.__fill[stream] = 0
+
+    def append(self, stream, *columns):
+        """Append a batch of rows to a stream.
+
+        Args:
+            stream (str): Name of the stream
+            *columns (np.ndarray): One 1D array per column of the stream, all of the same length
+        """
+
+        buffers = self.__buffers[stream]
+        n = len(columns[0])
+        done = 0
+        while done < n:
+            fill = self.__fill[stream]
+            take = min(n - done, self.__chunk - fill)
+            for buffer, column in zip(buffers, columns):
+                buffer[fill:fill + take] = column[done:done + take]
+            self.__fill[stream] = fill + take
+            done += take
+            if self.__fill[stream] == self.__chunk:
+                self.__flush_stream(stream)
+
+    def append_row(self, stream, *values):
+        """Append a single row to a stream, e.g. once per frame, without building arrays.
+
+        Args:
+            stream (str): Name of the stream
+            *values: One value per column of the stream
+        """
+
+        fill = self.__fill[stream]
+        for buffer, value in zip(self.__buffers[stream], values):
+            buffer[fill] = value
+        self.__fill[stream] = fill + 1
+        if fill + 1 == self.__chunk:
+            self.__flush_stream(stream)
+
+    def __flush_stream(self, stream):
+        fill = self.__fill[stream]
+        for buffer, f in zip(self.__buffers[stream], self.__files[stream]):
+            f.write(buffer[:fill])
+        self.__fill[stream] = 0
+
+    def flush(self):
+        """Write the buffered rows of every stream out to the files."""
+
+        for stream in self.__buffers:
+            self.__flush_stream(stream)
+            for f in self.__files[stream]:
+                f.flush()
+
+    def close(self):
+        """Flush and close the column files."""
+
+        for stream in self.__buffers:
+            self.__flush_stream(stream)
+            for f in self.__files[stream]:
+                f.close()
+
+def open_session(path):
+    """Open a recorded session for analysis.
+
+    Args:
+        path (str): Directory of the session
+
+    Returns:
+        (dict, dict): The metadata, and stream name -> column name -> read-only memory-mapped array
+    """
+
+    with open(os.path.join(path, MANIFEST_FILENAME)) as f:
+        manifest = json.load(f)
+
+    streams = {}
+    for stream, columns in manifest['schema'].items():
+        # a session cut short may have some columns a few rows ahead of the others
+        lengths = [os.path.getsize(os.path.join(path, _column_filename(stream, name))) // np.dtype(dtype).itemsize
+                   for name, dtype in columns]
+        n = min(lengths)
+        streams[stream] = {}
+        for name, dtype in columns:
+            if n == 0:
+                # an empty file can't be mapped
+                streams[stream][name] = np.zeros(0, dtype=dtype)
+            else:
+                streams[stream][name] = np.memmap(os.path.join(path, _column_filename(stream, name)),
+                                                  dtype=dtype, mode='r', shape=(n,))
+    return manifest['meta'], streams
@@ -0,0 +1,83 @@
+"""Start-up time of the entry points, from python -X importtime.
+
+Every entry point is imported in a fresh interpreter and the cumulative import
+time of it and of its slowest dependencies is reported, along with which of the
+heavy packages got loaded. A headless replay session with a cached onset envelope
+is then started from scratch, timed until it's ready to play, e.g.
+
+    python startup_benchmark.py --repeat 5 --top 8
+"""
+import sys
+import time
+import argparse
+import subprocess
+
+ENTRY_POINTS = ['dance2music', 'Pop_on_Beat', 'replay', 'batch_analyze', 'beat_grid', 'waveform_pyramid']
+
+# packages that only the code paths needing them should load
+HEAVY_PACKAGES = ['librosa.core', 'numba', 'scipy', 'matplotlib.pyplot', 'pyaudio', 'serial']
+
+# from a fresh interpreter to a Dance2Music session ready to play, without a sensor or a sound card
+FAST_START = """
+import numpy as np
+from dance2music import Dance2Music
+from replay import ReplaySource
+from onset_cache import OnsetCache
+session = Dance2Music(None, None, {audio!r}, replay=ReplaySource((np.zeros(0), np.zeros(0, dtype=np.int16)), speed=None))
+session.get_onset_envelope(OnsetCache())
+"""
+
+def import_times(module):
+    """Import a module in a fresh interpreter.
+
+    Args:
+        module (str): Name of the module
+
+    Returns:
+        dict: module name -> (self, cumulative) import time (s) and nesting depth, for every module imported
+    """
+
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import ' + module],
+                            stderr=subprocess.PIPE, universal_newlines=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package"
+        fields = line[len('import time:'):].split('|')
+        if not line.startswith('import time:') or not fields[0].strip().isdigit():
+            continue
+        name = fields[2].rstrip()
+        # nested imports are indented by two spaces per level
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        times[name.strip()] = (int(fields[0]) / 1e6, int(fields[1]) / 1e6, depth)
+    return times
+
+def fast_start_time(audio_filename):
+    """Wall-clock time (s) of a fresh interpreter starting a headless session, see FAST_START."""
+
+    start = time.perf_counter()
+    subprocess.run([sys.executable, '-c', FAST_START.format(audio=audio_filename)], check=True)
+    return time.perf_counter() - start
+
+def report(module, runs, top):
+    # the fastest run, the others were slowed down by something else
+    times = min(runs, key=lambda t: t[module][1])
+    print(module)
+    print('  import         {0:.0f} ms'.format(1000 * times[module][1]))
+    # only the direct dependencies, the rest is included in them
+    direct = [(name, t) for name, t in times.items() if t[2] == 1]
+    for name, (_, cumulative, _) in sorted(direct, key=lambda item: item[1][1], reverse=True)[:top]:
+        print('    {0:<28} {1:.0f} ms'.format(name, 1000 * cumulative))
+    loaded = [name for name in HEAVY_PACKAGES if name in times]
+    print('  heavy packages {0}'.format(', '.join(loaded) if loaded else 'none'))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--audio', default='West_Bubbles.wav', help='WAV file of the fast-start session')
+    parser.add_argument('--repeat', type=int, default=3, help='how many times each entry point is imported')
+    parser.add_argument('--top', type=int, default=5, help='how many of the slowest imports are listed')
+    args = parser.parse_args()
+
+    for module in ENTRY_POINTS:
+        report(module, [import_times(module) for _ in range(args.repeat)], args.top)
+    print('fast start (headless session, cached envelope): {0:.0f} ms'.format(
+        1000 * min(fast_start_time(args.audio) for _ in range(args.repeat))))
@@ -0,0 +1,218 @@
+import inspect
+import math
+import numpy as np
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from wav_mmap import MappedWave
+from pop_align import beat_times
+
+TrackAnalysis = namedtuple('TrackAnalysis', [
+    'sr',           # sampling rate of the audio
+    'onset_env',    # normalized onset envelope, one value per hop
+    'tempo',        # estimated tempo (bpm)
+    'beats',        # beat times (s)
+])
+
+AnalysisInput = namedtuple('AnalysisInput', [
+    'waveform',     # mono waveform to analyze
+    'sr',           # its sampling rate
+    'hop_length',   # hop at that rate, the same duration as the hop at the file's rate
+    'n_fft',        # FFT window at that rate, the same duration as the window at the file's rate
+])
+
+def channel_waveform(mapped_wave, channel='right'):
+    """Get one channel of a memory-mapped WAV file as a (zero-copy) waveform.
+
+    Args:
+        mapped_wave (MappedWave): The audio file
+        channel (str): Either 'left' or 'right', mono files only have the one
+
+    Returns:
+        np.ndarray: The waveform, a strided view into the file
+    """
+
+    ch = 0 if channel == 'left' else 1
+    return mapped_wave.channel(min(ch, mapped_wave.getnchannels() - 1))
+
+def downmix(mapped_wave):
+    """Get the mean of the channels of a memory-mapped WAV file, so that nothing panned to one side is missed.
+
+    Args:
+        mapped_wave (MappedWave): The audio file
+
+    Returns:
+        np.ndarray: The float32 mono waveform
+    """
+
+    n_channels = mapped_wave.getnchannels()
+    mix = np.array(mapped_wave.channel(0), dtype=np.float32)
+    for ch in range(1, n_channels):
+        mix += mapped_wave.channel(ch)
+    if n_channels > 1:
+        mix /= n_channels
+    return mix
+
+def analysis_rate(sr, hop_length=512, n_fft=2048, analysis_sr=None):
+    """Scale the hop and the FFT window to an analysis rate, keeping their durations.
+
+    Args:
+        sr (int): Sampling rate of the file
+        hop_length (int): By how many samples (at the file's rate) the frame is shifted
+        n_fft (int): Length of the FFT window (at the file's rate)
+        analysis_sr (int): Rate to analyze at, the file's rate if None
+
+    Returns:
+        (int, int, int): The analysis rate, and the hop and the FFT window at that rate
+
+    Raises:
+        ValueError: If the hop isn't a whole number of samples at the analysis rate
+    """
+
+    if analysis_sr is None or analysis_sr == sr:
+        return sr, hop_length, n_fft
+    if hop_length * analysis_sr % sr != 0:
+        raise ValueError('A hop of {0} samples at {1} Hz is no whole number of samples at {2} Hz'.format(
+            hop_length, sr, analysis_sr))
+    return analysis_sr, hop_length * analysis_sr // sr, max(1, n_fft * analysis_sr // sr)
+
+def analysis_waveform(mapped_wave, channel='right', analysis_sr=None, hop_length=512, n_fft=2048):
+    """The analysis front end: pick or mix down the channels and resample to the analysis rate.
+
+    The hop and the FFT window are scaled with the rate, so the onset envelope still has
+    a frame per hop_length samples of the file and its frame indexes line up with the
+    playback position. The resampling is polyphase (scipy.signal.resample_poly) and
+    zero-phase, so the transients aren't shifted. Whatever is processed here stays float32;
+    a single channel at the file's rate (the default) isn't processed at all, it's returned
+    as the int16 view of the file, which onset_envelope() still analyzes in float64.
+
+    Args:
+        mapped_wave (MappedWave): The audio file
+        channel (str): Either 'left', 'right' or 'mix' (the mean of all channels)
+        analysis_sr (int): Rate to analyze at, e.g. 22050, the file's rate if None
+        hop_length (int): By how many samples (at the file's rate) the frame is shifted
+        n_fft (int): Length of the FFT window (at the file's rate)
+
+    Returns:
+        AnalysisInput: The waveform to analyze and the parameters to analyze it with
+
+    Raises:
+        ValueError: If the hop isn't a whole number of samples at the analysis rate
+    """
+
+    sr = mapped_wave.getframerate()
+    analysis_sr, analysis_hop, analysis_n_fft = analysis_rate(sr, hop_length, n_fft, analysis_sr)
+    waveform = downmix(mapped_wave) if channel == 'mix' else channel_waveform(mapped_wave, channel)
+    if analysis_sr != sr:
+        from scipy.signal import resample_poly
+        gcd = math.gcd(sr, analysis_sr)
+        waveform = resample_poly(np.asarray(waveform, dtype=np.float32), analysis_sr // gcd, sr // gcd)
+        waveform = waveform.astype(np.float32, copy=False)
+    return AnalysisInput(waveform, analysis_sr, analysis_hop, analysis_n_fft)
+
+def _float_samples(samples):
+    """Float samples as they are (float32 from the front end), integer ones as float64."""
+
+    samples = np.asarray(samples)
+    return samples if np.issubdtype(samples.dtype, np.floating) else samples.astype(np.float64)
+
+def onset_envelope(waveform, sr, hop_length=512, n_fft=2048):
+    """Get the normalized onset envelope of a waveform, as used by the session classes.
+
+    Args:
+        waveform (np.ndarray): The mono waveform, integer samples are analyzed as float64
+        sr (int): Sampling rate of the audio
+        hop_length (int): By how many samples the frame is shifted
+        n_fft (int): Length of the FFT window
+
+    Returns:
+        np.ndarray: The onset envelope, normalized to a peak of 1
+    """
+
+    import librosa as rosa
+
+    onset_env = rosa.onset.onset_strength(
+        y=_float_samples(waveform),
+        sr=sr,
+        hop_length=hop_length,
+        n_fft=n_fft,
+        aggregate=np.mean)
+
+    # normalize the onset envelope
+    onset_env /= np.max(onset_env)
+    return onset_env
+
+def _segment_mel_db(padded, sr, n_fft, hop_length, first, last):
+    """Mel spectrogram (dB, not floored yet) of the frames [first, last) of a padded waveform."""
+
+    import librosa as rosa
+
+    segment = _float_samples(padded[first * hop_length:(last - 1) * hop_length + n_fft])
+    S = rosa.feature.melspectrogram(y=segment, sr=sr, n_fft=n_fft, hop_length=hop_length, center=False)
+    return rosa.power_to_db(S, top_db=None)
+
+def segmented_onset_envelope(waveform, sr, hop_length=512, n_fft=2048, segment_frames=1024, workers=None):
+    """Same as onset_envelope(), but the spectrogram is computed in segments on a pool of threads
+    (the FFTs and the mel projection release the GIL), so only a few segments' STFTs are in memory
+    at once instead of the whole track's.
+
+    The waveform is padded like a centered STFT and each segment takes the samples of its frames
+    plus the window overlap, so every frame is computed from exactly the same samples as in one
+    pass. The steps that need the whole track (the top_db floor relative to the loudest bin, the
+    difference to the previous frame and the normalization) run on the stitched mel spectrogram.
+
+    Args:
+        waveform (np.ndarray): The mono waveform
+        sr (int): Sampling rate of the audio
+        hop_length (int): By how many samples the frame is shifted
+        n_fft (int): Length of the FFT window
+        segment_frames (int): How many frames each segment spans
+        workers (int): How many threads compute the segments, ThreadPoolExecutor's default if None
+
+    Returns:
+        np.ndarray: The onset envelope, normalized to a peak of 1
+    """
+
+    import librosa as rosa
+
+    # pad like librosa's centered STFT does
+    pad_mode = inspect.signature(rosa.stft).parameters['pad_mode'].default
+    padded = np.pad(np.asarray(waveform), n_fft // 2, mode=pad_mode)
+    n_frames = 1 + (len(padded) - n_fft) // hop_length
+
+    bounds = list(range(0, n_frames, segment_frames)) + [n_frames]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        segments = executor.map(lambda first, last: _segment_mel_db(padded, sr, n_fft, hop_length, first, last),
+                                bounds[:-1], bounds[1:])
+        S = np.concatenate(list(segments), axis=1)
+
+    # the floor of power_to_db(top_db=80), relative to the loudest bin of the whole track
+    np.maximum(S, S.max() - 80.0, out=S)
+
+    # onset strength: mean increase over the mel bands, shifted like onset_strength() does
+    shift = 1 + n_fft // (2 * hop_length)
+    onset_env = np.zeros(n_frames)
+    onset_env[shift:] = np.mean(np.maximum(0., np.diff(S, axis=1)), axis=0)[:n_frames - shift]
+
+    # normalize the onset envelope
+    onset_env /= np.max(onset_env)
+    return onset_env
+
+def analyze_track(audio_filename, hop_length=512, channel='right'):
+    """Analyze one audio file: onset envelope, tempo and beats.
+
+    Args:
+        audio_filename (str): Which WAV file to analyze
+        hop_length (int): By how many samples the frame is shifted
+        channel (str): Either 'left' or 'right', from which channel to get the audio waveform
+
+    Returns:
+        TrackAnalysis: The results
+    """
+
+    mapped_wave = MappedWave(audio_filename)
+    sr = mapped_wave.getframerate()
+    onset_env = onset_envelope(channel_waveform(mapped_wave, channel), sr, hop_length)
+    mapped_wave.close()
+
+    tempo, beats = beat_times(onset_env, sr, hop_length)
+    return TrackAnalysis(sr, onset_env, tempo, beats)
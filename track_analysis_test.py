@@ -0,0 +1,68 @@
+import time
+import numpy as np
+from wav_mmap import MappedWave
+from track_analysis import channel_waveform, onset_envelope, segmented_onset_envelope, analysis_rate, analysis_waveform
+
+filename = 'West_Bubbles.wav'
+hop_length = 512
+
+mapped_wave = MappedWave(filename)
+fs = mapped_wave.getframerate()
+audio_mono = channel_waveform(mapped_wave, 'right')
+
+def test_segmented_matches_single_pass():
+    onset_env = onset_envelope(audio_mono, fs, hop_length)
+    # segment boundaries on every few frames, including segments shorter than the window
+    for segment_frames in (1024, 100, 3, 1):
+        segmented_env = segmented_onset_envelope(audio_mono, fs, hop_length, segment_frames=segment_frames)
+
+        assert segmented_env.shape == onset_env.shape
+        assert np.allclose(segmented_env, onset_env, rtol=0, atol=1e-12)
+
+def test_segmented_matches_single_pass_on_odd_length():
+    # a length that's neither a multiple of the hop nor of the segments
+    waveform = audio_mono[:12345]
+    onset_env = onset_envelope(waveform, fs, hop_length)
+    segmented_env = segmented_onset_envelope(waveform, fs, hop_length, segment_frames=7, workers=2)
+
+    assert segmented_env.shape == onset_env.shape
+    assert np.allclose(segmented_env, onset_env, rtol=0, atol=1e-12)
+
+def test_front_end_at_file_rate_is_unchanged():
+    analysis = analysis_waveform(mapped_wave, 'right', None, hop_length)
+
+    assert analysis.sr == fs and analysis.hop_length == hop_length
+    assert np.array_equal(analysis.waveform, audio_mono)
+
+def test_resampled_envelope_lines_up_with_playback():
+    analysis = analysis_waveform(mapped_wave, 'mix', fs // 2, hop_length)
+    assert analysis.waveform.dtype == np.float32
+    assert analysis.hop_length == hop_length // 2
+    # a frame per hop_length samples of the file, either way
+    reference = onset_envelope(analysis_waveform(mapped_wave, 'mix', None, hop_length).waveform, fs, hop_length)
+    onset_env = onset_envelope(analysis.waveform, analysis.sr, analysis.hop_length, analysis.n_fft)
+
+    assert abs(len(onset_env) - len(reference)) <= 1
+    n = min(len(onset_env), len(reference))
+    assert np.corrcoef(onset_env[:n], reference[:n])[0, 1] > 0.98
+
+def test_analysis_rate_needs_whole_hops():
+    assert analysis_rate(44100, 512, 2048, 22050) == (22050, 256, 1024)
+    try:
+        analysis_rate(44100, 512, 2048, 16000)
+    except ValueError:
+        pass
+    else:
+        assert False, 'a hop of 185.76 samples was accepted'
+
+if __name__ == '__main__':
+    # the first librosa call pays for the mel filter bank and the FFT plans
+    onset_envelope(audio_mono[:fs], fs, hop_length)
+    start = time.perf_counter()
+    onset_env = onset_envelope(audio_mono, fs, hop_length)
+    print('single pass: {0:.3f} s'.format(time.perf_counter() - start))
+    for segment_frames in (4096, 1024, 256):
+        start = time.perf_counter()
+        segmented_env = segmented_onset_envelope(audio_mono, fs, hop_length, segment_frames=segment_frames)
+        print('{0} frames per segment: {1:.3f} s, max error {2:.3g}'.format(
+            segment_frames, time.perf_counter() - start, np.max(np.abs(segmented_env - onset_env))))
@@ -0,0 +1,145 @@
+import os
+import mmap
+import struct
+import numpy as np
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+class MappedWave:
+    """A WAV reader that memory-maps the data chunk instead of reading it into memory,
+    so that each channel can be handed out as a strided NumPy view without any copy.
+
+    Supports 8/16/24/32-bit integer PCM and 32-bit float. The getter methods mirror
+    the ones of wave.Wave_read.
+    """
+
+    def __init__(self, filename):
+        """Parse the RIFF header and map the data chunk.
+
+        Args:
+            filename (str): From which file to read the audio
+        """
+
+        self.__filename = filename
+        file_size = os.path.getsize(filename)
+
+        with open(filename, 'rb') as f:
+            riff, _, wave_id = struct.unpack('<4sI4s', f.read(12))
+            if riff != b'RIFF' or wave_id != b'WAVE':
+                raise ValueError('{0} is not a RIFF/WAVE file'.format(filename))
+
+            fmt = None
+            while True:
+                header = f.read(8)
+                if len(header) < 8:
+                    raise ValueError('{0} has no data chunk'.format(filename))
+                chunk_id, chunk_size = struct.unpack('<4sI', header)
+
+                if chunk_id == b'fmt ':
+                    fmt = f.read(chunk_size)
+                elif chunk_id == b'data':
+                    self.__data_offset = f.tell()
+                    # streamed files may leave the size unset, so clamp to what's on disk
+                    self.__data_size = min(chunk_size, file_size - self.__data_offset)
+                    break
+                else:
+                    f.seek(chunk_size, os.SEEK_CUR)
+                # chunks are word-aligned
+                if chunk_size % 2:
+                    f.seek(1, os.SEEK_CUR)
+
+        if fmt is None:
+            raise ValueError('{0} has no fmt chunk before its data chunk'.format(filename))
+
+        format_tag, self.__nchannels, self.__framerate, _, block_align, bits_per_sample = \
+            struct.unpack('<HHIIHH', fmt[:16])
+        if format_tag == WAVE_FORMAT_EXTENSIBLE:
+            # the sub-format GUID starts with the actual format tag
+            format_tag, = struct.unpack('<H', fmt[24:26])
+
+        self.__sampwidth = bits_per_sample // 8
+        self.__nframes = self.__data_size // block_align
+
+        if format_tag == WAVE_FORMAT_IEEE_FLOAT and self.__sampwidth == 4:
+            self.__dtype = np.dtype('<f4')
+        elif format_tag != WAVE_FORMAT_PCM:
+            raise ValueError('Unsupported WAV format tag {0:#06x}'.format(format_tag))
+        elif self.__sampwidth == 1:
+            # 8-bit PCM is unsigned
+            self.__dtype = np.dtype('u1')
+        elif self.__sampwidth == 2:
+            self.__dtype = np.dtype('<i2')
+        elif self.__sampwidth == 3:
+            # no native 24-bit type, the samples are exposed as raw byte triplets
+            self.__dtype = np.dtype('u1')
+        elif self.__sampwidth == 4:
+            self.__dtype = np.dtype('<i4')
+        else:
+            raise ValueError('Unsupported sample width of {0} bits'.format(bits_per_sample))
+
+        self.__raw = np.memmap(filename, dtype=np.uint8, mode='r',
+                               offset=self.__data_offset,
+                               shape=(self.__nframes * block_align,))
+
+    def getnchannels(self):
+        return self.__nchannels
+
+    def getsampwidth(self):
+        return self.__sampwidth
+
+    def getframerate(self):
+        return self.__framerate
+
+    def getnframes(self):
+        return self.__nframes
+
+    @property
+    def raw(self):
+        """The data chunk as a flat, read-only uint8 memory map (interleaved PCM bytes)."""
+        return self.__raw
+
+    @property
+    def frames(self):
+        """The audio as a 2D (frames x channels) array.
+
+        A zero-copy view for every format but 24-bit, which has to be widened to int32.
+        """
+
+        if self.__sampwidth == 3:
+            return self.__widen_24bit(self.__raw.reshape(self.__nframes, self.__nchannels, 3))
+        return self.__raw.view(self.__dtype).reshape(self.__nframes, self.__nchannels)
+
+    def prefetch(self):
+        """Fault the whole data chunk into memory now, by touching one byte per page, so that
+        reading it later (e.g. from a real-time audio callback) doesn't wait for the disk."""
+
+        np.add.reduce(self.__raw[::mmap.PAGESIZE], dtype=np.uint64)
+
+    def channel(self, ch):
+        """Get one channel of the audio as a 1D strided view into the mapped file.
+
+        24-bit audio is widened to int32, so only that one channel is copied.
+
+        Args:
+            ch (int): Index of the channel, 0 being left
+        """
+
+        if self.__sampwidth == 3:
+            triplets = self.__raw.reshape(self.__nframes, self.__nchannels, 3)[:, ch, :]
+            return self.__widen_24bit(triplets)
+        return self.frames[:, ch]
+
+    @staticmethod
+    def __widen_24bit(triplets):
+        """Sign-extend little-endian 24-bit samples (a trailing axis of 3 bytes) into int32."""
+
+        widened = np.zeros(triplets.shape[:-1] + (4,), dtype=np.uint8)
+        # leave the lowest byte empty and shift right afterwards to keep the sign
+        widened[..., 1:] = triplets
+        return widened.view('<i4')[..., 0] >> 8
+
+    def close(self):
+        """Release the memory map. Views handed out before keep the file mapped until they're gone."""
+        self.__raw = None
@@ -0,0 +1,125 @@
+import numpy as np
+
+class WaveformPyramid:
+    """A min/max decimation pyramid of a signal, for plotting it whole at any zoom.
+
+    Level 0 keeps the lowest and the highest sample of every block of `base` samples,
+    each further level those of `factor` blocks of the level below, so a level has
+    at most a few thousand blocks for even a long track. A plot only needs about one
+    block per pixel: drawing the min and the max of each block as a vertical stroke
+    looks the same as drawing every sample, at a fraction of the points. Narrow
+    ranges, where there are fewer samples than pixels, are drawn from the samples.
+
+    Level 0 is built in chunks straight from the signal, which can be a memory-mapped
+    WAV channel (see wav_mmap), so the track is read once and never copied whole. The
+    signal can be any 1D series with a rate, e.g. an onset envelope at sr / hop_length.
+    """
+
+    def __init__(self, signal, rate, base=64, factor=4, chunk=1 << 20):
+        """Build the pyramid.
+
+        Args:
+            signal (np.ndarray): The 1D signal, e.g. a channel of MappedWave.frames
+            rate (float): Its sampling rate (samples per second)
+            base (int): Samples per block of the finest level
+            factor (int): By how much each level is coarser than the one below
+            chunk (int): How many samples are read at a time to build the finest level
+        """
+
+        self.__signal = signal
+        self.__rate = float(rate)
+        n = len(signal)
+
+        # the finest level, chunk by chunk; whole blocks per chunk so none straddles two
+        chunk = max(base, chunk // base * base)
+        lows, highs = [], []
+        for first in range(0, n, chunk):
+            samples = np.asarray(signal[first:first + chunk])
+            bounds = np.arange(0, len(samples), base)
+            lows.append(np.minimum.reduceat(samples, bounds))
+            highs.append(np.maximum.reduceat(samples, bounds))
+        levels = [(base, np.concatenate(lows) if lows else np.zeros(0), np.concatenate(highs) if highs else np.zeros(0))]
+
+        # every further level from the one below, until a single block is left
+        while len(levels[-1][1]) > 1:
+            block, lows, highs = levels[-1]
+            bounds = np.arange(0, len(lows), factor)
+            levels.append((block * factor, np.minimum.reduceat(lows, bounds), np.maximum.reduceat(highs, bounds)))
+        self.__levels = levels
+
+    def __len__(self):
+        return len(self.__signal)
+
+    @property
+    def rate(self):
+        return self.__rate
+
+    @property
+    def duration(self):
+        """Length of the signal (s)."""
+        return len(self.__signal) / self.__rate
+
+    @property
+    def block_sizes(self):
+        """Samples per block of each level, finest first."""
+        return [block for block, _, _ in self.__levels]
+
+    def level(self, samples_per_pixel):
+        """Pick the coarsest level with at most samples_per_pixel samples per block.
+
+        Args:
+            samples_per_pixel (float): How many samples fall on a pixel of the plot
+
+        Returns:
+            int: Index of the level, -1 for the samples themselves
+        """
+
+        blocks = np.array(self.block_sizes)
+        return int(np.searchsorted(blocks, samples_per_pixel, side='right')) - 1
+
+    def extremes(self, t0=None, t1=None, width=1000):
+        """Get the signal over a time range, decimated for a plot of the given width.
+
+        Args:
+            t0 (float): Start of the range (s), the start of the signal by default
+            t1 (float): End of the range (s), the end of the signal by default
+            width (int): Width of the plot in pixels
+
+        Returns:
+            (np.ndarray, np.ndarray, np.ndarray): The start times (s) of the blocks (or samples)
+                covering the range, and their lowest and highest values
+        """
+
+        n = len(self.__signal)
+        first = 0 if t0 is None else min(n, max(0, int(np.floor(t0 * self.__rate))))
+        last = n if t1 is None else min(n, max(first, int(np.ceil(t1 * self.__rate)) + 1))
+        level = self.level((last - first) / float(max(1, width)))
+        if level < 0:
+            samples = np.asarray(self.__signal[first:last])
+            return np.arange(first, last) / self.__rate, samples, samples
+
+        block, lows, highs = self.__levels[level]
+        # every block that overlaps the range
+        first, last = first // block, -(-last // block)
+        times = np.arange(first, last) * block / self.__rate
+        return times, lows[first:last], highs[first:last]
+
+    def envelope(self, t0=None, t1=None, width=1000):
+        """Get the signal over a time range as a single polyline, ready for Line2D.set_data().
+
+        Every block becomes a vertical stroke from its lowest to its highest value; the
+        samples of a narrow range are joined as they are.
+
+        Args:
+            t0 (float): Start of the range (s), the start of the signal by default
+            t1 (float): End of the range (s), the end of the signal by default
+            width (int): Width of the plot in pixels
+
+        Returns:
+            (np.ndarray, np.ndarray): The x (s) and y of the polyline
+        """
+
+        times, lows, highs = self.extremes(t0, t1, width)
+        if lows is highs:
+            return times, lows
+        return np.repeat(times, 2), np.column_stack((lows, highs)).ravel()
@@ -0,0 +1,49 @@
+import time
+import numpy as np
+from wav_mmap import MappedWave
+from waveform_pyramid import WaveformPyramid
+
+filename = 'West_Bubbles.wav'
+
+mapped_wave = MappedWave(filename)
+fs = mapped_wave.getframerate()
+audio_right = mapped_wave.channel(1)
+
+def test_levels_match_brute_force():
+    # a small chunk, so that the finest level is built from several of them
+    pyramid = WaveformPyramid(audio_right, fs, base=64, factor=4, chunk=10000)
+    samples = np.asarray(audio_right)
+    for level, block in enumerate(pyramid.block_sizes[:4]):
+        times, lows, highs = pyramid.extremes(width=len(samples) // block)
+        assert pyramid.level(block) == level
+        assert len(lows) == -(-len(samples) // block)
+        for i in (0, len(lows) // 2, len(lows) - 1):
+            assert lows[i] == samples[i * block:(i + 1) * block].min()
+            assert highs[i] == samples[i * block:(i + 1) * block].max()
+            assert times[i] == i * block / float(fs)
+
+def test_narrow_range_returns_samples():
+    pyramid = WaveformPyramid(audio_right, fs)
+    times, lows, highs = pyramid.extremes(1.0, 1.01, width=1000)
+    first = int(fs * 1.0)
+    assert np.array_equal(lows, audio_right[first:first + len(lows)])
+    assert lows is highs
+    assert times[0] == first / float(fs)
+
+def test_envelope_covers_range_at_plot_width():
+    pyramid = WaveformPyramid(audio_right, fs)
+    x, y = pyramid.envelope(5.0, 15.0, width=800)
+    assert len(x) == len(y)
+    # about a stroke per pixel
+    assert 800 <= len(x) // 2 <= 4 * 800
+    assert x[0] <= 5.0 and x[-1] >= 15.0 - pyramid.block_sizes[-1] / float(fs)
+
+if __name__ == '__main__':
+    start = time.perf_counter()
+    pyramid = WaveformPyramid(audio_right, fs)
+    print('pyramid of {0} samples: {1:.3f} s, blocks of {2}'.format(
+        len(pyramid), time.perf_counter() - start, pyramid.block_sizes))
+    for t0, t1 in ((0, pyramid.duration), (10, 20), (10, 10.01)):
+        start = time.perf_counter()
+        x, _ = pyramid.envelope(t0, t1, width=1000)
+        print('{0} - {1} s: {2} points in {3:.2f} ms'.format(t0, t1, len(x), 1000 * (time.perf_counter() - start)))